@@ -20,6 +20,67 @@ class Config :
     
     API_KEY = os.getenv("API_KEY", None)
     
+    # 本地資料儲存後端："json" 為每個檔案一份 JSON，"sqlite" 為 WAL 模式的 SQLite (首次啟動時自動匯入 JSON 資料)
+    DB_BACKEND = os.getenv("DB_BACKEND", "json").lower()
+    DB_FLUSH_DELAY = float(os.getenv("DB_FLUSH_DELAY", 0.5)) # seconds a task save waits so bursts become one write; 0 writes at once
+    HISTORY_FSYNC = os.getenv("HISTORY_FSYNC", "true").lower() == "true" # fsync every archived task (JSON backend)
+    HISTORY_COMPACT_ON_START = os.getenv("HISTORY_COMPACT_ON_START", "true").lower() == "true" # fold legacy monthly JSON into the logs in the background
+    
+    # 日曆本地快取：以 syncToken 增量同步，讀取時直接使用本地資料
+    CALENDAR_SYNC_ENABLED = os.getenv("CALENDAR_SYNC_ENABLED", "true").lower() == "true"
+    CALENDAR_SYNC_INTERVAL = int(os.getenv("CALENDAR_SYNC_INTERVAL", 30)) # seconds between two incremental syncs
+    CALENDAR_SYNC_LOOKBACK_DAYS = int(os.getenv("CALENDAR_SYNC_LOOKBACK_DAYS", 30)) # how far back the full sync reaches
+    CALENDAR_SYNC_LOOKAHEAD_DAYS = int(os.getenv("CALENDAR_SYNC_LOOKAHEAD_DAYS", 180)) # how far ahead the full sync reaches; half used triggers a new full sync
+    CALENDAR_CONCURRENT_FETCH = os.getenv("CALENDAR_CONCURRENT_FETCH", "true").lower() == "true" # query calendars in parallel
+    CONTEXT_CALENDAR_DAYS = int(os.getenv("CONTEXT_CALENDAR_DAYS", 7)) # calendar window loaded once per command
+    
+    # 排程：本地計算候選空檔後，只把精簡的清單交給模型
+    SCHEDULER_HORIZON_DAYS = int(os.getenv("SCHEDULER_HORIZON_DAYS", 7)) # search range when the task has no deadline
+    SCHEDULER_MAX_CANDIDATES = int(os.getenv("SCHEDULER_MAX_CANDIDATES", 20)) # slots sent to the model
+    SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "hybrid").lower() # "local" | "llm" | "hybrid" (local draft refined by the model)
+    
+    # LLM 回應快取：依提示類型設定存活秒數，0 代表不快取 (狀態控制的時間戳每次都不同)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 256))
+    LLM_CACHE_DISK = os.getenv("LLM_CACHE_DISK", "true").lower() == "true"
+    LLM_CACHE_TTLS = {"intent": 300, "schedule": 120, "slice": 1800, "resolve": 3600, "state": 0}
+    LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true" # stream schedule recommendations as each one completes
+
+    # 模型分級：每種提示類型對應一個等級，超過延遲預算時改用更快的等級
+    MODEL_TIERS = { # ordered from fastest to highest quality
+        "fast": os.getenv("MODEL_TIER_FAST", "gemini-2.5-flash-lite"),
+        "balanced": os.getenv("MODEL_TIER_BALANCED", "gemini-2.5-flash"),
+        "quality": os.getenv("MODEL_TIER_QUALITY", "gemini-2.5-pro"),
+    }
+    MODEL_ROUTES = {"intent": "fast", "resolve": "fast", "state": "balanced", "schedule": "quality", "slice": "quality"}
+    LLM_LATENCY_BUDGETS = {"intent": 5, "resolve": 5, "state": 10, "schedule": 25, "slice": 40} # seconds per call, fallbacks included
+    
+    # 提示內容的 token 預算：超過時依各區段的優先順序截斷
+    PROMPT_TOKEN_BUDGETS = {"events": 1200, "calendar_tasks": 600, "tasks": 600, "candidates": 1000, "similar_tasks": 800}
+    
+    # 相似任務檢索：排程與切分任務時只附上名稱最相近的幾筆歷史紀錄
+    SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", 5))
+    SIMILARITY_MIN_SCORE = float(os.getenv("SIMILARITY_MIN_SCORE", 0.2)) # cosine similarity of character n-grams
+    
+    # 本地意圖判斷：高信心的簡單指令不呼叫 Gemini
+    INTENT_FAST_PATH_ENABLED = os.getenv("INTENT_FAST_PATH_ENABLED", "true").lower() == "true"
+    INTENT_FAST_PATH_THRESHOLD = float(os.getenv("INTENT_FAST_PATH_THRESHOLD", 0.8))
+    
+    # 任務狀態轉換："local" 由本地狀態機處理，"llm" 交給 AI 狀態控制器
+    STATE_CONTROL_MODE = os.getenv("STATE_CONTROL_MODE", "local").lower()
+    
+    # 語音辨識：錄音中以音量偵測語音片段，說完一段就先在背景辨識
+    WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base") # loaded in the background after the window is up
+    AUDIO_STREAMING_TRANSCRIBE = os.getenv("AUDIO_STREAMING_TRANSCRIBE", "true").lower() == "true"
+    AUDIO_VAD_ENERGY = float(os.getenv("AUDIO_VAD_ENERGY", 400)) # RMS of int16 samples counted as speech
+    AUDIO_VAD_SILENCE_MS = int(os.getenv("AUDIO_VAD_SILENCE_MS", 500)) # pause that ends a segment
+    AUDIO_SEGMENT_MIN_SECONDS = float(os.getenv("AUDIO_SEGMENT_MIN_SECONDS", 3)) # shorter segments lose too much context
+    AUDIO_SEGMENT_MAX_SECONDS = float(os.getenv("AUDIO_SEGMENT_MAX_SECONDS", 25)) # Whisper decodes 30 s windows
+    AUDIO_MAX_RECORD_SECONDS = float(os.getenv("AUDIO_MAX_RECORD_SECONDS", 120)) # size of the preallocated capture buffer
+    AUDIO_WARM_CAPTURE = os.getenv("AUDIO_WARM_CAPTURE", "false").lower() == "true" # keep the microphone stream open between recordings
+    AUDIO_PREROLL_SECONDS = float(os.getenv("AUDIO_PREROLL_SECONDS", 1.5)) # audio before the hotkey kept in warm capture mode
+    AUDIO_DEBUG_WAV = os.getenv("AUDIO_DEBUG_WAV", "false").lower() == "true" # also save each recording to LOG_DIR
+    
     @classmethod
     def validate(cls) :
         missings = []
@@ -0,0 +1,117 @@
+import copy
+import asyncio
+import datetime
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+from config import config
+from utils.logger import logger
+from utils.helper import TAIPEI_TZ, event_bounds, parse_event_time
+from data.db_manager import db
+from services.calendar_sync import calendar_service
+
+@dataclasses.dataclass(frozen = True)
+class CommandContext :
+    """Immutable snapshot of everything one voice/text command reads.
+
+    Gathered once per `process_voice` call, so intent analysis, scheduling, state control and the
+    calendar view all see the same tasks and events without re-reading files or re-fetching the
+    calendar. Archived tasks are not loaded: prompts use the behaviour profile and the similarity
+    index, which are kept up to date on archive.
+    """
+    now: datetime.datetime
+    window_start: datetime.datetime
+    window_end: datetime.datetime
+    calendar_events: tuple = ()
+    active_tasks: tuple = ()
+
+    @classmethod
+    def gather(cls, now: datetime.datetime | None = None) -> "CommandContext" :
+        """Load the calendar window and the active tasks concurrently."""
+        now = now or datetime.datetime.now(TAIPEI_TZ)
+        window_start, window_end = cls._window(now)
+
+        with ThreadPoolExecutor(max_workers = 2, thread_name_prefix = "context") as executor :
+            events_future = executor.submit(calendar_service.get_calendar_events, "all",
+                                            window_start.isoformat(timespec = "seconds"),
+                                            window_end.isoformat(timespec = "seconds"))
+            tasks_future = executor.submit(db.get_current_task)
+
+        context = cls(now = now,
+                      window_start = window_start,
+                      window_end = window_end,
+                      calendar_events = tuple(events_future.result() or []),
+                      active_tasks = tuple(tasks_future.result() or []))
+        logger.info(f"Command context gathered: {len(context.calendar_events)} events, {len(context.active_tasks)} active tasks.")
+        return context
+
+    @classmethod
+    async def gather_async(cls, now: datetime.datetime | None = None) -> "CommandContext" :
+        """Awaitable `gather`; both loads run concurrently on the event loop."""
+        now = now or datetime.datetime.now(TAIPEI_TZ)
+        window_start, window_end = cls._window(now)
+        events, tasks = await asyncio.gather(
+            calendar_service.get_calendar_events_async("all", window_start.isoformat(timespec = "seconds"), window_end.isoformat(timespec = "seconds")),
+            asyncio.to_thread(db.get_current_task))
+
+        context = cls(now = now,
+                      window_start = window_start,
+                      window_end = window_end,
+                      calendar_events = tuple(events or []),
+                      active_tasks = tuple(tasks or []))
+        logger.info(f"Command context gathered: {len(context.calendar_events)} events, {len(context.active_tasks)} active tasks.")
+        return context
+
+    @staticmethod
+    def _window(now: datetime.datetime) -> tuple[datetime.datetime, datetime.datetime] :
+        # 結束時間不包含在內 (下一個午夜)，以 time.max 結尾的查詢 (23:59:59.999999) 才會落在視窗內
+        window_start = now.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+        window_end = window_start + datetime.timedelta(days = config.CONTEXT_CALENDAR_DAYS + 1)
+        return window_start, window_end
+
+    def with_active_tasks(self, tasks: list | None) -> "CommandContext" :
+        """Return a copy reflecting the active tasks after this command changed them."""
+        return dataclasses.replace(self, active_tasks = tuple(tasks or []))
+
+    def tasks(self) -> list :
+        """Mutable deep copy of the active tasks."""
+        return copy.deepcopy(list(self.active_tasks))
+
+    def events(self, calendar: str | None = None) -> list :
+        """Events of the whole window, optionally only those of one calendar."""
+        return [e for e in self.calendar_events if calendar is None or e.get("type") == calendar]
+
+    def events_between(self, start: str | datetime.datetime | None, end: str | datetime.datetime | None, calendar: str = "all") -> list :
+        """Events overlapping [start, end), served from the snapshot when the window covers the range.
+
+        Ranges reaching outside the window (e.g. a far-away deadline) are fetched from the calendar service.
+        """
+        start_dt, end_dt = self._range(start, end)
+        if not self.covers(start_dt, end_dt) :
+            return calendar_service.get_calendar_events(calendar, start_dt.isoformat(), end_dt.isoformat())
+        return self._events_in(start_dt, end_dt, calendar)
+
+    async def events_between_async(self, start: str | datetime.datetime | None, end: str | datetime.datetime | None, calendar: str = "all") -> list :
+        """Awaitable `events_between`."""
+        start_dt, end_dt = self._range(start, end)
+        if not self.covers(start_dt, end_dt) :
+            return await calendar_service.get_calendar_events_async(calendar, start_dt.isoformat(), end_dt.isoformat())
+        return self._events_in(start_dt, end_dt, calendar)
+
+    def covers(self, start: datetime.datetime, end: datetime.datetime) -> bool :
+        """Whether [start, end) lies inside the window [window_start, window_end)."""
+        return self.window_start <= start and end <= self.window_end
+
+    def _range(self, start, end) -> tuple[datetime.datetime, datetime.datetime] :
+        start_dt = parse_event_time(start) if isinstance(start, str) else start
+        end_dt = parse_event_time(end) if isinstance(end, str) else end
+        return start_dt or self.window_start, end_dt or self.window_end
+
+    def _events_in(self, start_dt: datetime.datetime, end_dt: datetime.datetime, calendar: str) -> list :
+        matched = []
+        for event in self.calendar_events :
+            if calendar != "all" and event.get("type") != calendar :
+                continue
+            bounds = event_bounds(event)
+            if bounds and bounds[1] > start_dt and bounds[0] < end_dt :
+                matched.append(event)
+        return matched
@@ -0,0 +1,107 @@
+import re
+from config import config
+from utils.logger import logger
+from utils.helper import fuzzy_match
+
+# 各意圖的觸發詞 (中文與英文)
+INTENT_PATTERNS = {
+    "PAUSE_TASK": re.compile(r"暫停|先停|停一下|休息一下|\bpause\b|\btake a break\b|\bhold on\b", re.IGNORECASE),
+    "RESUME_TASK": re.compile(r"繼續|恢復|回來做|\bresume\b|\bcontinue\b|\bback to\b", re.IGNORECASE),
+    "COMPLETE_TASK": re.compile(r"完成了?|做完了?|寫完了?|結束了|搞定了?|\bdone\b|\bfinished\b|\bfinish\b|\bcompleted?\b", re.IGNORECASE),
+    "START_TASK": re.compile(r"開始做?|\bstart(?:ing)?\b|\bbegin\b|\bwork on\b", re.IGNORECASE),
+    "QUERY_TASK": re.compile(r"今天.*(行程|待辦|要做)|有什麼(行程|事)|查詢|行程表|\bwhat'?s on\b|\bagenda\b|\bschedule today\b|\bmy schedule\b", re.IGNORECASE),
+}
+# 出現這些字代表可能是複合指令或新增任務，一律交給 Gemini
+DEFER_PATTERN = re.compile(r"然後|接著|之後|再來|並且|同時|順便|提醒|安排|新增|加入|排進|明天|後天|下週|下禮拜|點|"
+                           r"\band then\b|\bthen\b|\balso\b|\bremind\b|\bschedule\b(?! today)|\badd\b|\btomorrow\b|\bnext week\b|\bat \d",
+                           re.IGNORECASE)
+REASON_PATTERN = re.compile(r"(?:因為|由於|\bbecause\b|\bsince\b)\s*(.+)$", re.IGNORECASE)
+FILLER_PATTERN = re.compile(r"我要|我想|我先|我|要|想|先|把|的|了|一下|好了|吧|呢|啊|這個|那個|任務|工作|"
+                            r"\bi'?m\b|\bi am\b|\bi\b|\bplease\b|\bthe\b|\bmy\b|\btask\b|\bwith\b|\bnow\b|\bok(?:ay)?\b|[\s,.!?，。！？、~]+",
+                            re.IGNORECASE)
+# 不指定任務名稱時，各動作可以作用的任務狀態
+ELIGIBLE_STATUS = {"PAUSE_TASK": {"IN_PROGRESS"}, "RESUME_TASK": {"PAUSED"}, "COMPLETE_TASK": {"IN_PROGRESS", "PAUSED"}}
+
+class IntentClassifier :
+    """Rule-based fast path for simple single-action commands.
+
+    Recognises START/PAUSE/RESUME/COMPLETE/QUERY phrased in Chinese or English and resolves the
+    task name by fuzzy matching against the active tasks and task-calendar events. It returns the
+    same intent list structure as `LLMClient.analyze_intent`, or None when it is not confident,
+    in which case the caller falls back to Gemini.
+    """
+    def classify(self, text: str, active_tasks: list, calendar_tasks: list | None = None) -> list | None :
+        """Classify a command locally.
+
+        Args:
+            text (str): Raw command text.
+            active_tasks (list): Active tasks from the command context.
+            calendar_tasks (list, optional): Task-calendar events, used to correct names of new tasks.
+
+        Returns:
+            list | None: `[{"intent": ..., "content": {...}}]`, or None when confidence is below
+            `config.INTENT_FAST_PATH_THRESHOLD`.
+        """
+        if not config.INTENT_FAST_PATH_ENABLED or not text or not text.strip() :
+            return None
+        text = text.strip()
+        if DEFER_PATTERN.search(text) :
+            return None
+
+        matched = [intent for intent, pattern in INTENT_PATTERNS.items() if pattern.search(text)]
+        # "開始" 與 "繼續" 同時出現時 (例如「繼續開始寫報告」)，以繼續為準
+        if set(matched) == {"START_TASK", "RESUME_TASK"} :
+            matched = ["RESUME_TASK"]
+        if len(matched) != 1 :
+            return None
+        intent = matched[0]
+
+        if intent == "QUERY_TASK" :
+            return self._result(intent, {"summary": None, "query_type": "STATUS"}, 0.9, text)
+
+        reason = None
+        reason_match = REASON_PATTERN.search(text)
+        if reason_match :
+            reason = reason_match.group(1).strip() or None
+            text = text[:reason_match.start()]
+        remainder = FILLER_PATTERN.sub(" ", INTENT_PATTERNS[intent].sub(" ", text)).strip()
+
+        summary, confidence = self._resolve_name(intent, remainder, active_tasks, calendar_tasks or [])
+        if summary is None :
+            return None
+
+        content = {"summary": summary}
+        if intent in ("PAUSE_TASK", "RESUME_TASK", "COMPLETE_TASK") :
+            content["reason"] = reason
+        return self._result(intent, content, confidence, text)
+
+    def _resolve_name(self, intent: str, remainder: str, active_tasks: list, calendar_tasks: list) -> tuple[str | None, float] :
+        if not remainder :
+            # 沒說任務名稱 (例如「我做完了」)：只有唯一符合狀態的任務時才能確定
+            eligible = [t for t in active_tasks if t.get("status") in ELIGIBLE_STATUS.get(intent, set())]
+            if len(eligible) == 1 :
+                return eligible[0].get("summary"), 0.9
+            return None, 0.0
+
+        names = [t.get("summary", "") for t in active_tasks]
+        if intent == "START_TASK" :
+            names += [e.get("summary", "") for e in calendar_tasks]
+        # 只有部分字串相符 (「寫報告第二章」與「寫報告」、「讀書」與「讀書會報告」) 不算高信心，交給 Gemini 判斷
+        matches = fuzzy_match(remainder, names, cutoff = 0.5, containment = 0.0)
+        if not matches :
+            return None, 0.0
+        if len(matches) > 1 and matches[0][1] - matches[1][1] < 0.1 :
+            return None, 0.0
+        if intent == "START_TASK" and matches[0][1] < 1.0 :
+            # 開始任務只接受名稱完全相同，否則可能是要建立新任務
+            return None, 0.0
+        return matches[0]
+
+    def _result(self, intent: str, content: dict, confidence: float, text: str) -> list | None :
+        if confidence < config.INTENT_FAST_PATH_THRESHOLD :
+            return None
+        result = [{"intent": intent, "content": content}]
+        logger.info(f"Fast-path intent for '{text}' (confidence {confidence:.2f}): {result}")
+        return result
+
+intent_classifier = IntentClassifier()
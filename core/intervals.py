@@ -0,0 +1,161 @@
+import bisect
+import datetime
+from collections import Counter
+from typing import Iterable, Iterator
+from config import config
+from utils.helper import TAIPEI_TZ, event_bounds, parse_event_time, parse_duration_minutes
+
+BUFFER = datetime.timedelta(minutes = 5) # 與既有行程之間的緩衝
+SLOT_STEP = datetime.timedelta(minutes = 30) # 候選時段的起始時間對齊單位
+DAILY_TASK_LIMIT = 5
+# 可排程時段：平日 08:30-22:00，週末 07:30-22:00
+WEEKDAY_WINDOW = (datetime.time(8, 30), datetime.time(22, 0))
+WEEKEND_WINDOW = (datetime.time(7, 30), datetime.time(22, 0))
+
+class IntervalIndex :
+    """Sorted list of disjoint busy intervals.
+
+    Overlapping or touching intervals are merged on insert, so lookups are a binary search
+    and walking the free gaps of a range is linear in the number of busy blocks inside it.
+    """
+    def __init__(self, intervals: Iterable[tuple[datetime.datetime, datetime.datetime]] = ()) :
+        self._starts = []
+        self._ends = []
+        for start, end in intervals :
+            self.add(start, end)
+
+    def __len__(self) -> int :
+        return len(self._starts)
+
+    def add(self, start: datetime.datetime, end: datetime.datetime) :
+        if end <= start :
+            return
+        # 找出所有與 [start, end] 重疊或相接的區間，合併成一個
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+        if lo < hi :
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def is_free(self, start: datetime.datetime, end: datetime.datetime) -> bool :
+        i = bisect.bisect_right(self._ends, start)
+        return i >= len(self._starts) or self._starts[i] >= end
+
+    def free_gaps(self, start: datetime.datetime, end: datetime.datetime) -> Iterator[tuple[datetime.datetime, datetime.datetime]] :
+        """Yield the free (gap_start, gap_end) ranges inside [start, end)."""
+        cursor = start
+        i = bisect.bisect_right(self._ends, start)
+        while i < len(self._starts) and self._starts[i] < end :
+            if self._starts[i] > cursor :
+                yield cursor, self._starts[i]
+            cursor = max(cursor, self._ends[i])
+            i += 1
+        if cursor < end :
+            yield cursor, end
+
+    @classmethod
+    def from_events(cls, events: Iterable[dict], buffer: datetime.timedelta = BUFFER) -> "IntervalIndex" :
+        """Build the index from calendar events and local tasks, padding each one with `buffer`."""
+        index = cls()
+        for event in events :
+            bounds = event_bounds(event)
+            if bounds is None :
+                continue
+            start, end = bounds
+            index.add(start - buffer, end + buffer)
+        return index
+
+def count_tasks_per_day(events: Iterable[dict]) -> Counter :
+    """Count task-calendar events per local date, for the daily task limit."""
+    counts = Counter()
+    for event in events :
+        if event.get("type") != "task" :
+            continue
+        bounds = event_bounds(event)
+        if bounds :
+            counts[bounds[0].date()] += 1
+    return counts
+
+def _ceil_to_step(dt: datetime.datetime, step: datetime.timedelta) -> datetime.datetime :
+    midnight = dt.replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+    steps = -((midnight - dt) // step) # ceil division
+    return midnight + steps * step
+
+def find_free_slots(index: IntervalIndex,
+                    duration: datetime.timedelta,
+                    start_boundary: datetime.datetime,
+                    deadline: datetime.datetime,
+                    daily_counts: Counter | None = None,
+                    step: datetime.timedelta = SLOT_STEP) -> list[tuple[datetime.datetime, datetime.datetime]] :
+    """Enumerate every slot that satisfies the scheduling hard constraints.
+
+    Args:
+        index (IntervalIndex): Busy intervals, already padded with the buffer.
+        duration (datetime.timedelta): Required length of the slot.
+        start_boundary (datetime.datetime): Earliest allowed start.
+        deadline (datetime.datetime): The slot must end by this time.
+        daily_counts (Counter, optional): Tasks already planned per date; full days are skipped.
+        step (datetime.timedelta, optional): Alignment of candidate start times. Defaults to 30 minutes.
+
+    Returns:
+        list: (start, end) tuples in chronological order.
+    """
+    daily_counts = daily_counts or Counter()
+    start_boundary = start_boundary.astimezone(TAIPEI_TZ)
+    deadline = deadline.astimezone(TAIPEI_TZ)
+    slots = []
+    day = start_boundary.date()
+    while day <= deadline.date() :
+        if daily_counts[day] < DAILY_TASK_LIMIT :
+            open_time, close_time = WEEKEND_WINDOW if day.weekday() >= 5 else WEEKDAY_WINDOW
+            window_start = max(start_boundary, TAIPEI_TZ.localize(datetime.datetime.combine(day, open_time)))
+            window_end = min(deadline, TAIPEI_TZ.localize(datetime.datetime.combine(day, close_time)))
+            for gap_start, gap_end in index.free_gaps(window_start, window_end) :
+                slot_start = _ceil_to_step(gap_start, step)
+                while slot_start + duration <= gap_end :
+                    slots.append((slot_start, slot_start + duration))
+                    slot_start += step
+        day += datetime.timedelta(days = 1)
+    return slots
+
+def shortlist(slots: list, limit: int) -> list :
+    """Pick at most `limit` slots spread evenly over the range, always keeping the first and last."""
+    if len(slots) <= limit :
+        return list(slots)
+    if limit <= 1 :
+        return slots[:limit]
+    stride = (len(slots) - 1) / (limit - 1)
+    return [slots[round(i * stride)] for i in range(limit)]
+
+def find_candidate_slots(command: dict, calendar_events: list, active_tasks: list, now: datetime.datetime) -> list[tuple[datetime.datetime, datetime.datetime]] :
+    """Compute every slot for a new task from the ADD_TASK content.
+
+    Hard constraints: the task's estimated duration, a start boundary of one hour from now,
+    the deadline minus five minutes (or the scheduling horizon when there is none), the buffer
+    around existing events and active tasks, the daily windows and the daily task limit.
+
+    Args:
+        command (dict): ADD_TASK content (`summary`, `due_date`, `estimated_duration`).
+        calendar_events (list): Existing calendar events.
+        active_tasks (list): Active tasks from `db.get_current_task()`.
+        now (datetime.datetime): Reference time.
+
+    Returns:
+        list: (start, end) tuples in chronological order.
+    """
+    duration = datetime.timedelta(minutes = parse_duration_minutes(command.get("estimated_duration")))
+    start_boundary = now + datetime.timedelta(hours = 1)
+
+    deadline = parse_event_time(command.get("due_date"))
+    if deadline is None :
+        deadline = now + datetime.timedelta(days = config.SCHEDULER_HORIZON_DAYS)
+    elif len(command["due_date"].strip()) <= 10 :
+        # 只有日期的截止時間視為當天結束
+        deadline = deadline.replace(hour = 23, minute = 59, second = 59)
+    effective_deadline = deadline - datetime.timedelta(minutes = 5)
+
+    busy = list(calendar_events) + [t for t in active_tasks if t.get("status") != "COMPLETED"]
+    index = IntervalIndex.from_events(busy)
+    return find_free_slots(index, duration, start_boundary, effective_deadline, count_tasks_per_day(calendar_events))
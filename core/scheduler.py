@@ -0,0 +1,247 @@
+import datetime
+import numpy as np
+from config import config
+from utils.logger import logger
+from utils.helper import parse_event_time
+from core.intervals import find_candidate_slots, shortlist
+from core.context import CommandContext
+from data.behaviour_profile import BehaviourProfile, behaviour_profile
+from services.llm_client import llm_client
+
+TIERS = ("rational_best", "lowest_resistance", "minimum_viable")
+EFFICIENCY_PERIODS = ((datetime.time(8, 30), datetime.time(10, 0)),
+                      (datetime.time(13, 30), datetime.time(15, 0)),
+                      (datetime.time(20, 0), datetime.time(22, 0)))
+WORK_HOURS = (datetime.time(8, 30), datetime.time(17, 0))
+
+WEEKDAYS = ("週一", "週二", "週三", "週四", "週五", "週六", "週日")
+
+class HistoryStats :
+    """Weekday x hour-of-day completion and pause counts from the behaviour profile."""
+    def __init__(self, completions: np.ndarray | None = None, pauses: np.ndarray | None = None, total: int = 0) :
+        self.completions = completions if completions is not None else np.zeros((7, 24), dtype = np.int32)
+        self.pauses = pauses if pauses is not None else np.zeros((7, 24), dtype = np.int32)
+        self.total = total
+        # 單一星期與小時的樣本很少，以所有星期同一小時的平均作為先驗
+        self._hour_completions = self.completions.sum(axis = 0) / 7
+        self._hour_pauses = self.pauses.sum(axis = 0) / 7
+
+    @classmethod
+    def from_profile(cls, profile: BehaviourProfile = behaviour_profile) -> "HistoryStats" :
+        data = profile.snapshot()
+        return cls(data["completions"], data["pauses"], int(data["starts"].sum()))
+
+    def friction(self, weekday: int, hour: int) -> float :
+        """Pauses per completed task in this weekday/hour, smoothed so that empty cells score neutrally."""
+        pauses = self.pauses[weekday, hour] + self._hour_pauses[hour]
+        completions = self.completions[weekday, hour] + self._hour_completions[hour]
+        return float((pauses + 1) / (completions + 2))
+
+    def slot_cells(self, start: datetime.datetime, end: datetime.datetime) -> list[tuple[int, int]] :
+        hours = range(start.hour, max(start.hour + 1, end.hour + (end.minute > 0)))
+        return [(start.weekday(), h % 24) for h in hours]
+
+    def slot_friction(self, start: datetime.datetime, end: datetime.datetime) -> float :
+        cells = self.slot_cells(start, end)
+        return sum(self.friction(*cell) for cell in cells) / len(cells)
+
+def _within(start: datetime.datetime, end: datetime.datetime, period: tuple[datetime.time, datetime.time]) -> bool :
+    return period[0] <= start.time() and end.time() <= period[1] and start.date() == end.date()
+
+def _rational_score(slot: tuple) -> int :
+    start, end = slot
+    score = 0
+    if _within(start, end, WORK_HOURS) :
+        score += 2
+    if any(period[0] <= start.time() < period[1] for period in EFFICIENCY_PERIODS) :
+        score += 1
+    return score
+
+def _to_recommendation(slot: tuple, summary: str, reason: str) -> dict :
+    start, end = slot
+    return {
+        "reason": reason,
+        "summary": summary,
+        "start": {"dateTime": start.isoformat(timespec = "seconds"), "timeZone": "Asia/Taipei"},
+        "end": {"dateTime": end.isoformat(timespec = "seconds"), "timeZone": "Asia/Taipei"},
+    }
+
+def _pick(slots: list, key, taken: set) :
+    """Best slot by `key`, preferring one not already recommended by another tier."""
+    ranked = sorted(slots, key = key)
+    for slot in ranked :
+        if slot not in taken :
+            return slot
+    return ranked[0]
+
+def recommend(command: dict, slots: list, stats: HistoryStats | None = None) -> dict :
+    """Build the three recommendation tiers from the free slots, without an LLM call.
+
+    Args:
+        command (dict): ADD_TASK content.
+        slots (list): (start, end) slots satisfying the hard constraints, chronological.
+        stats (HistoryStats, optional): Behaviour statistics for the lowest-resistance tier. Read from the profile when omitted.
+
+    Returns:
+        dict: Same shape as the scheduler prompt's success format.
+    """
+    if not slots :
+        return {"status": "fail", "reason": "截止時間前找不到足夠長的空檔，請調整截止時間或預估時長。"}
+
+    summary = command.get("summary") or "新任務"
+    stats = stats or HistoryStats.from_profile()
+    taken = set()
+
+    rational = _pick(slots, lambda s : (-_rational_score(s), s[0]), taken)
+    taken.add(rational)
+
+    if stats.total :
+        resistance = _pick(slots, lambda s : (stats.slot_friction(*s), s[0]), taken)
+        weekday, hour = max(stats.slot_cells(*resistance), key = lambda c : (stats.completions[c], -stats.pauses[c]))
+        resistance_reason = (f"最低阻力：根據 {stats.total} 筆歷史紀錄，{WEEKDAYS[weekday]} {hour:02d}:00 時段完成 {stats.completions[weekday, hour]} 次、"
+                             f"暫停 {stats.pauses[weekday, hour]} 次，是你較不容易中斷的時段。")
+    else :
+        # 沒有歷史資料時，以最早可開始的時段降低拖延的機會
+        resistance = _pick(slots, lambda s : s[0], taken)
+        resistance_reason = "最低阻力：目前還沒有歷史紀錄，選擇最早可以開始的時段，趁早動手最不容易拖延。"
+    taken.add(resistance)
+
+    viable = _pick(slots, lambda s : -s[0].timestamp(), taken)
+
+    return {
+        "status": "success",
+        "recommendations": {
+            "rational_best": _to_recommendation(rational, summary, "理性分析：位於日間工作時段與高效率區間，且符合時長與截止時間限制。"),
+            "lowest_resistance": _to_recommendation(resistance, summary, resistance_reason),
+            "minimum_viable": _to_recommendation(viable, summary, "最低限度：截止前最晚仍能完成的時段。"),
+        },
+    }
+
+class Scheduler :
+    """Produces the ADD_TASK recommendations according to `config.SCHEDULER_MODE`.
+
+    - "local": scoring functions only, no network call to Gemini.
+    - "llm": Gemini ranks the locally computed candidate slots.
+    - "hybrid": the local result is sent to Gemini as a draft to refine; it is returned as-is
+      when Gemini fails or proposes a slot outside the candidates.
+    """
+    def suggest(self, command: dict, context: CommandContext | None = None, on_recommendation = None) -> dict | None :
+        """Recommend three slots for an ADD_TASK command.
+
+        Args:
+            command (dict): ADD_TASK content.
+            context (CommandContext, optional): Snapshot of the current command. Gathered when omitted.
+            on_recommendation (Callable[[str, dict], None], optional): Called with each validated (tier, recommendation)
+                while Gemini is still streaming the others. Not called for results computed locally.
+
+        Returns:
+            dict | None: Result in the scheduler prompt's format.
+        """
+        if command is None :
+            logger.warning("command is None.")
+            return None
+
+        context = context or CommandContext.gather()
+        calendar_events = context.events_between(None, self._fetch_end(command))
+        plan = self._plan(command, context, calendar_events)
+        if not isinstance(plan, tuple) :
+            return plan
+
+        candidates, candidate_slots, draft, fallback = plan
+        llm_result = llm_client.sugget_schedule(command, context, candidate_slots = candidate_slots, draft = draft,
+                                                on_recommendation = self._stream_filter(on_recommendation, candidates, fallback))
+        return self._validate(llm_result, candidates, fallback)
+
+    async def suggest_async(self, command: dict, context: CommandContext | None = None, on_recommendation = None) -> dict | None :
+        """Awaitable `suggest`; the calendar fetch and the Gemini call do not block the event loop."""
+        if command is None :
+            logger.warning("command is None.")
+            return None
+
+        context = context or await CommandContext.gather_async()
+        calendar_events = await context.events_between_async(None, self._fetch_end(command))
+        plan = self._plan(command, context, calendar_events)
+        if not isinstance(plan, tuple) :
+            return plan
+
+        candidates, candidate_slots, draft, fallback = plan
+        llm_result = await llm_client.sugget_schedule_async(command, context, candidate_slots = candidate_slots, draft = draft,
+                                                            on_recommendation = self._stream_filter(on_recommendation, candidates, fallback))
+        return self._validate(llm_result, candidates, fallback)
+
+    def _fetch_end(self, command: dict) -> str | None :
+        due_date = command.get("due_date")
+        return f"{due_date[:10]}T23:59:59+08:00" if due_date else None
+
+    def _plan(self, command: dict, context: CommandContext, calendar_events: list) -> dict | tuple :
+        """Run the local scheduler; return its final result, or what the LLM call needs.
+
+        Returns:
+            dict | tuple: The result when no LLM call is needed, otherwise
+            (candidates, candidate_slots, draft, fallback).
+        """
+        mode = config.SCHEDULER_MODE
+        slots = find_candidate_slots(command, calendar_events, context.tasks(), context.now)
+        local_result = recommend(command, slots)
+        if mode == "local" or local_result["status"] != "success" :
+            logger.info(f"Local scheduler result: {local_result}")
+            return local_result
+
+        candidates = shortlist(slots, config.SCHEDULER_MAX_CANDIDATES)
+        # 本地草案選中的時段必須在候選清單中，模型才能保留它們
+        for recommendation in local_result["recommendations"].values() :
+            slot = (parse_event_time(recommendation["start"]), parse_event_time(recommendation["end"]))
+            if slot not in candidates :
+                candidates.append(slot)
+        candidates.sort()
+        candidate_slots = [{"start": s.isoformat(timespec = "seconds"), "end": e.isoformat(timespec = "seconds")} for s, e in candidates]
+
+        draft = local_result["recommendations"] if mode == "hybrid" else None
+        fallback = local_result if mode == "hybrid" else None
+        return candidates, candidate_slots, draft, fallback
+
+    def _stream_filter(self, on_recommendation, candidates: list, fallback: dict | None) :
+        """Wrap the streaming callback so that only recommendations using a candidate slot reach it."""
+        if on_recommendation is None :
+            return None
+        allowed = set(candidates)
+
+        def streamed(tier: str, recommendation: dict) :
+            # 串流中的每個建議也要先檢查是否落在候選空檔內
+            if tier not in TIERS :
+                return
+            if self._is_candidate(recommendation, allowed) :
+                on_recommendation(tier, recommendation)
+            elif fallback is not None :
+                on_recommendation(tier, fallback["recommendations"][tier])
+        return streamed
+
+    def _is_candidate(self, recommendation, allowed: set) -> bool :
+        """Whether the recommendation uses exactly one candidate (start, end); a moved or longer end could overlap busy time."""
+        if not isinstance(recommendation, dict) :
+            return False
+        return (parse_event_time(recommendation.get("start")), parse_event_time(recommendation.get("end"))) in allowed
+
+    def _validate(self, result: dict | None, candidates: list, fallback: dict | None) -> dict | None :
+        """Keep only LLM recommendations that use a candidate slot; fill the rest from `fallback`."""
+        if not result or result.get("status") != "success" :
+            return fallback or result
+
+        allowed = set(candidates)
+        recommendations = result.get("recommendations") or {}
+        for tier in TIERS :
+            recommendation = recommendations.get(tier)
+            if self._is_candidate(recommendation, allowed) :
+                continue
+            logger.warning(f"LLM recommendation '{tier}' is not a candidate slot: {recommendation}")
+            if fallback is None :
+                recommendations.pop(tier, None)
+            else :
+                recommendations[tier] = fallback["recommendations"][tier]
+
+        if not recommendations :
+            return {"status": "fail", "reason": "AI 建議的時段皆不符合限制，請稍後再試。"}
+        result["recommendations"] = recommendations
+        return result
+
+scheduler = Scheduler()
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 from PyQt6.QtCore import QObject, pyqtSignal
 from dateutil.parser import parse
@@ -8,6 +9,138 @@ from utils.logger import logger
 from data.db_manager import db
 from services.llm_client import llm_client
 from services.calendar_sync import calendar_service
+from core.scheduler import scheduler
+from core.context import CommandContext
+from core.intent_classifier import intent_classifier
+from utils.helper import event_bounds, fuzzy_match, parse_event_time, same_name
+
+ACTIONS = {"START_TASK": "START", "PAUSE_TASK": "PAUSE", "RESUME_TASK": "RESUME", "COMPLETE_TASK": "COMPLETE"}
+AMBIGUITY_MARGIN = 0.1 # 最佳與次佳名稱分數差距小於此值時視為無法判斷
+
+class TaskTransitionEngine :
+    """Local implementation of the STATE_CONTROLLER_PROMPT rules.
+
+    The active-task list is updated in place and returned in the same shape the AI state controller
+    produced: a task completed by this action stays in the list with status "COMPLETED" so that the
+    caller can archive it. The LLM is only consulted when a spoken task name matches several tasks.
+    """
+    def apply(self, tasks: list, intent: dict, now: datetime.datetime | None = None, calendar_tasks: list | None = None) -> list | None :
+        """Apply one START/PAUSE/RESUME/COMPLETE intent.
+
+        Args:
+            tasks (list): Current active tasks; modified in place.
+            intent (dict): Intent from `analyze_intent`.
+            now (datetime.datetime, optional): Processing time. Defaults to now.
+            calendar_tasks (list, optional): Task calendar events used when starting a new task. Fetched when omitted.
+
+        Returns:
+            list | None: The updated task list, or None if the target task cannot be found.
+        """
+        action = ACTIONS.get(intent.get("intent"))
+        content = intent.get("content") or {}
+        summary = content.get("summary")
+        if action is None or not summary :
+            logger.warning(f"Unsupported state change intent: {intent}")
+            return None
+
+        now = now or datetime.datetime.now(pytz.timezone('Asia/Taipei'))
+        now_str = now.isoformat(timespec = "seconds")
+
+        # Phase 0：移除先前已完成 (應已歸檔) 的任務
+        tasks[:] = [t for t in tasks if t.get("status") != "COMPLETED"]
+
+        if action == "START" :
+            # 只有名稱完全相同 (忽略大小寫、空白與引號) 才視為同一個任務；「寫報告第二章」不是「寫報告」
+            task = next((t for t in tasks if same_name(t.get("summary", ""), summary)), None)
+            if task is None :
+                task = self._create(summary, now_str, calendar_tasks)
+                tasks.append(task)
+                logger.info(f"Task '{task['summary']}' created and started.")
+                return tasks
+            # 已存在的任務再次開始，視為繼續
+            action = "RESUME"
+        else :
+            task = self._find(tasks, summary)
+
+        if task is None :
+            logger.warning(f"No active task matches '{summary}'.")
+            return None
+
+        match action :
+            case "PAUSE" :
+                if task.get("status") != "PAUSED" :
+                    task["status"] = "PAUSED"
+                    task["_internal_pause_start_time"] = now_str
+                task["pause_reason"] = content.get("reason")
+                self._log(task, "PAUSE", now_str, content.get("reason"))
+            case "RESUME" :
+                self._end_pause(task, now)
+                task["status"] = "IN_PROGRESS"
+                self._log(task, "RESUME", now_str)
+            case "COMPLETE" :
+                self._end_pause(task, now)
+                start = parse_event_time(task.get("start")) or now
+                active_seconds = (now - start).total_seconds() - task.get("_internal_total_paused_seconds", 0)
+                task["status"] = "COMPLETED"
+                task["end"] = now_str
+                task["duration"] = max(0, round(active_seconds / 60))
+                task["pause_reason"] = None
+                task.pop("_internal_pause_start_time", None)
+                task.pop("_internal_total_paused_seconds", None)
+                self._log(task, "COMPLETE", now_str)
+        return tasks
+
+    def _find(self, tasks: list, summary: str) -> dict | None :
+        matches = fuzzy_match(summary, [t.get("summary", "") for t in tasks])
+        if not matches :
+            return None
+        name = matches[0][0]
+        if len(matches) > 1 and matches[0][1] - matches[1][1] < AMBIGUITY_MARGIN :
+            # 多個任務名稱同樣接近，才交給 LLM 判斷使用者指的是哪一個
+            name = llm_client.resolve_task_name(summary, [n for n, _ in matches])
+            if name is None :
+                return None
+        return next((t for t in tasks if t.get("summary") == name), None)
+
+    def _create(self, summary: str, now_str: str, calendar_tasks: list | None) -> dict :
+        task = {
+            "task_id": str(uuid.uuid4()),
+            "summary": summary,
+            "status": "IN_PROGRESS",
+            "start": now_str,
+            "pause_reason": None,
+            "_internal_pause_start_time": None,
+            "_internal_total_paused_seconds": 0,
+            "logs": [],
+        }
+        # 若日曆上有同名的待辦，沿用日曆上的名稱與 ID，並記下預計時長
+        if calendar_tasks is None :
+            calendar_tasks = calendar_service.get_calendar_events("task")
+        event = next((e for e in calendar_tasks if same_name(e.get("summary", ""), summary)), None)
+        if event is not None :
+            task["summary"] = event["summary"]
+            task["task_id"] = event.get("id", task["task_id"])
+            bounds = event_bounds(event)
+            if bounds :
+                task["planned_minutes"] = round((bounds[1] - bounds[0]).total_seconds() / 60)
+        self._log(task, "START", now_str)
+        return task
+
+    def _end_pause(self, task: dict, now: datetime.datetime) :
+        pause_start = parse_event_time(task.get("_internal_pause_start_time"))
+        if task.get("status") == "PAUSED" and pause_start is not None :
+            paused = max(0, round((now - pause_start).total_seconds()))
+            task["_internal_total_paused_seconds"] = task.get("_internal_total_paused_seconds", 0) + paused
+        task["_internal_pause_start_time"] = None
+        task["pause_reason"] = None
+
+    def _log(self, task: dict, event: str, now_str: str, reason: str | None = None) :
+        entry = {"event": event, "time": now_str}
+        if reason :
+            entry["reason"] = reason
+        task.setdefault("logs", []).append(entry)
+
+transition_engine = TaskTransitionEngine()
 
 class TaskStateManager(QObject) :
     task_info = pyqtSignal(list) # task info
@@ -21,14 +154,37 @@ class TaskStateManager(QObject) :
     
     def __init__(self) :
         super().__init__()
+        # 所有指令共用同一個事件迴圈：Gemini 的非同步客戶端會綁定在第一次使用的迴圈上
+        self._loop = asyncio.new_event_loop()
 
-    def fetch_and_emit_calendar(self, suggestions=None, target_date_str=None):
+    def fetch_and_emit_calendar(self, suggestions=None, target_date_str=None, context: CommandContext | None = None):
         """
         新增一個統一抓取並發送日曆資料的方法。
         它會抓取指定日期的既有行程，並可選擇性地合併傳入的建議行程。
+        傳入 context 時直接使用該指令的快照，不再重新讀取日曆與任務。
         """
         schedule_list = suggestions if suggestions is not None else []
+        fetch_start, fetch_end = self._calendar_range(schedule_list, target_date_str)
         
+        # 1. 抓取 Google 日曆事件
+        if context is not None:
+            all_events = context.events_between(fetch_start, fetch_end)
+        else:
+            all_events = calendar_service.get_calendar_events("all", start=fetch_start, end=fetch_end)
+        self._emit_calendar(schedule_list, suggestions, all_events, fetch_start, fetch_end, context)
+
+    async def fetch_and_emit_calendar_async(self, suggestions=None, target_date_str=None, context: CommandContext | None = None):
+        """可等待的 fetch_and_emit_calendar：超出快照範圍的日曆查詢不會卡住事件迴圈。"""
+        schedule_list = suggestions if suggestions is not None else []
+        fetch_start, fetch_end = self._calendar_range(schedule_list, target_date_str)
+        if context is not None:
+            all_events = await context.events_between_async(fetch_start, fetch_end)
+        else:
+            all_events = await calendar_service.get_calendar_events_async("all", fetch_start, fetch_end)
+        self._emit_calendar(schedule_list, suggestions, all_events, fetch_start, fetch_end, context)
+
+    def _calendar_range(self, schedule_list: list, target_date_str) -> tuple[str, str]:
+        """找出涵蓋所有建議行程與目標日期的抓取範圍。"""
         # --- 核心修正：動態計算涵蓋所有相關日期的時間範圍 ---
         # 之前的邏輯只抓取單一目標日期的事件，導致其他日期的既有事件遺失。
         # 新邏輯會找出所有建議行程和目標日期，並抓取這個完整區間的所有事件。
@@ -62,15 +218,15 @@ class TaskStateManager(QObject) :
             today = datetime.datetime.now(pytz.timezone('Asia/Taipei')).date()
             fetch_start = datetime.datetime.combine(today, datetime.time.min).isoformat() + "+08:00"
             fetch_end = datetime.datetime.combine(today, datetime.time.max).isoformat() + "+08:00"
-        
-        # 1. 抓取 Google 日曆事件
-        all_events = calendar_service.get_calendar_events("all", start=fetch_start, end=fetch_end)
-        
+        return fetch_start, fetch_end
+
+    def _emit_calendar(self, schedule_list: list, suggestions, all_events: list, fetch_start: str, fetch_end: str, context: CommandContext | None):
+        """合併既有行程與建議行程後發送給日曆視圖。"""
         # 2. 關鍵修正：只有在「非」新增建議行程的模式下 (例如一般查詢)，才合併本地資料庫的任務。
         # 當使用者要新增任務時 (suggestions is not None)，我們只顯示 Google 日曆上的既有行程，
         # 避免本地端尚未同步的任務造成畫面混亂，讓使用者能根據最準確的日曆來做決策。
         if suggestions is None:
-            local_tasks = db.get_current_task() or []
+            local_tasks = context.tasks() if context is not None else (db.get_current_task() or [])
             for task in local_tasks:
                 if task.get("status") != "COMPLETED":
                     schedule_list.append({
@@ -106,34 +262,113 @@ class TaskStateManager(QObject) :
         logger.info(f"發送行程列表，共 {len(schedule_list)} 個事件")
         self.task_info.emit(schedule_list)
 
+    def _to_suggestions(self, recommendations: dict) -> list:
+        """把排程建議轉成日曆視圖使用的建議行程格式。"""
+        suggestions_list = []
+        for key, value in recommendations.items():
+            new_schedule = value.copy()
+            new_schedule['type'] = 'suggest'
+            new_schedule['text'] = new_schedule.get('summary', '無摘要')
+            suggestions_list.append(new_schedule)
+        return suggestions_list
+
+    async def _change_status(self, intent: dict, context: CommandContext) -> list | None:
+        """依設定以本地狀態機或 AI 狀態控制器處理 START/PAUSE/RESUME/COMPLETE。"""
+        if config.STATE_CONTROL_MODE == "llm":
+            # AI 狀態控制器會處理所有邏輯，包括從 Google Calendar 查找任務
+            new_task_list = await llm_client.change_status_async(intent, context)
+            if new_task_list is not None:
+                return new_task_list
+            # 模型在延遲預算內沒有回應 (或無法套用) 時，改由本地狀態機處理
+            logger.warning("AI state controller gave no usable answer, falling back to the local engine.")
+        # 本地狀態機在名稱無法判斷時會同步呼叫 LLM，放到執行緒中避免卡住事件迴圈
+        return await asyncio.to_thread(transition_engine.apply, context.tasks(), intent, None, context.events("task"))
+
+    async def _state_chain(self, intents: list, indexes: list, context: CommandContext) -> dict:
+        """依序計算所有狀態變更；後一個意圖看到前一個意圖之後的任務列表，但不寫入資料庫。"""
+        results = {}
+        for index in indexes:
+            new_task_list = await self._change_status(intents[index], context)
+            results[index] = new_task_list
+            if new_task_list is not None:
+                context = context.with_active_tasks([t for t in new_task_list if t.get("status") != "COMPLETED"])
+        return results
+
+    async def _suggest(self, index: int, content: dict, context: CommandContext, stream: bool) -> dict:
+        streamed = {}
+        redraws = []
+        redraw_lock = asyncio.Lock()
+
+        async def redraw(suggestions):
+            # 依建議產生的順序重繪，較晚的畫面不會被較早但查詢較慢的覆蓋
+            async with redraw_lock:
+                await self.fetch_and_emit_calendar_async(suggestions, content.get("due_date"), context)
+                self.show_calendar_signal.emit()
+
+        def on_recommendation(tier, recommendation):
+            # 串流模式：每完成一個建議就先更新日曆，不必等三個建議全部產生
+            # 回呼在事件迴圈上同步執行，日曆查詢交給另一個協程，不在這裡等待網路
+            streamed[tier] = recommendation
+            redraws.append(asyncio.ensure_future(redraw(self._to_suggestions(streamed))))
+
+        response = await scheduler.suggest_async(content, context, on_recommendation if stream else None)
+        await asyncio.gather(*redraws)
+        return {index: (response, streamed)}
+
+    async def _compute_intents(self, intents: list, context: CommandContext) -> dict:
+        """同時計算互不相依的意圖：每個新增任務各自排程，狀態變更則依序串成一條。
+
+        Returns:
+            dict: 意圖索引 -> 計算結果，尚未寫入資料庫也尚未發送訊號。
+        """
+        add_indexes = [i for i, intent in enumerate(intents) if intent.get("intent") == "ADD_TASK"]
+        state_indexes = [i for i, intent in enumerate(intents) if intent.get("intent") in ACTIONS]
+
+        jobs = [self._state_chain(intents, state_indexes, context)]
+        # 多個新增任務同時串流會讓日曆畫面來回切換，只有單一新增任務時才逐一顯示建議
+        for index in add_indexes:
+            jobs.append(self._suggest(index, intents[index].get("content"), context, stream = len(add_indexes) == 1))
+
+        results = {}
+        for partial in await asyncio.gather(*jobs):
+            results.update(partial)
+        return results
+
     def process_voice(self, text: str):
         """處理使用者的語音或文字指令"""
-        intents = llm_client.analyze_intent(text)
+        # 在呼叫端的執行緒上執行事件迴圈，所有訊號都從同一個執行緒發送
+        self._loop.run_until_complete(self.process_voice_async(text))
+
+    async def process_voice_async(self, text: str):
+        # 整個指令只讀取一次日曆、任務與歷史紀錄，所有步驟共用同一份快照
+        context = await CommandContext.gather_async()
+        # 簡單的單一指令 (暫停、完成…) 由本地規則直接判斷，信心不足時才交給 Gemini
+        intents = intent_classifier.classify(text, context.tasks(), context.events("task"))
+        if intents is None:
+            intents = await llm_client.analyze_intent_async(text, context)
 
         if not intents:
             logger.error("Failed to analyze user intent or intent is empty.")
             self.error_info.emit("抱歉，我無法理解您的指令。")
             return
 
-        for intent in intents:
+        # 網路請求並行執行，結果再依照指令中的順序寫入資料庫並更新畫面
+        results = await self._compute_intents(intents, context)
+
+        for index, intent in enumerate(intents):
             match intent.get("intent"):
                 case "ADD_TASK":
                     content = intent.get("content")
-                    response = llm_client.sugget_schedule(content)
+                    response, streamed = results[index]
                     if response and response.get("status") == "success":
                         # 獲取 AI 建議行程
                         recommendations = response.get("recommendations", {})
-                        suggestions_list = []
-                        for key, value in recommendations.items():
-                            new_schedule = value.copy()
-                            new_schedule['type'] = 'suggest'
-                            new_schedule['text'] = new_schedule.get('summary', '無摘要')
-                            suggestions_list.append(new_schedule)
-                        
-                        # 呼叫統一的方法，傳入建議行程與目標日期
-                        self.fetch_and_emit_calendar(suggestions_list, content.get("due_date"))
-                        # 發送訊號，通知 UI 顯示日曆視圖
-                        self.show_calendar_signal.emit()
+                        # 最終結果與串流時已顯示的相同時，不需要重繪
+                        if recommendations != streamed:
+                            # 呼叫統一的方法，傳入建議行程與目標日期
+                            await self.fetch_and_emit_calendar_async(self._to_suggestions(recommendations), content.get("due_date"), context)
+                            # 發送訊號，通知 UI 顯示日曆視圖
+                            self.show_calendar_signal.emit()
 
                     elif response and response.get("reason"):
                         self.error_info.emit(response.get("reason"))
@@ -143,11 +378,11 @@ class TaskStateManager(QObject) :
                 case "START_TASK" | "PAUSE_TASK" | "RESUME_TASK":
                     logger.info(f"Processing state change intent: {intent.get('intent')}")
                     
-                    # AI 狀態控制器會處理所有邏輯，包括從 Google Calendar 查找任務
-                    new_task_list = llm_client.change_status(intent)
+                    new_task_list = results[index]
 
                     if new_task_list is not None:
                         db.save_current_task(new_task_list)
+                        context = context.with_active_tasks(new_task_list)
                         logger.info(f"Successfully updated task status. New list: {new_task_list}")
                         
                         task_summary = intent.get("content", {}).get("summary", "未知任務")
@@ -160,13 +395,13 @@ class TaskStateManager(QObject) :
                                 self.user_msg.emit(f"任務 '{task_summary}' 已繼續。")
                                 self.resume.emit()
                     else:
-                        self.error_info.emit("AI 狀態控制器處理失敗，無法變更任務狀態。")
+                        self.error_info.emit("狀態控制器處理失敗，無法變更任務狀態。")
 
                 case "COMPLETE_TASK":
                     logger.info(f"Processing state change intent: {intent.get('intent')}")
                     
-                    # AI 狀態控制器會將任務標記為已完成
-                    new_task_list_from_ai = llm_client.change_status(intent)
+                    # 狀態控制器會將任務標記為已完成
+                    new_task_list_from_ai = results[index]
 
                     if new_task_list_from_ai is not None:
                         task_to_archive = None
@@ -183,6 +418,7 @@ class TaskStateManager(QObject) :
                             # 建立最終的當前任務列表 (移除已歸檔的任務)
                             final_task_list = [t for t in new_task_list_from_ai if t.get("task_id") != task_to_archive.get("task_id")]
                             db.save_current_task(final_task_list)
+                            context = context.with_active_tasks(final_task_list)
                             
                             self.complete_info.emit(task_to_archive)
                             self.user_msg.emit(f"任務 '{task_to_archive.get('summary')}' 已完成。")
@@ -190,15 +426,16 @@ class TaskStateManager(QObject) :
                         else:
                             # 這種情況不應該發生，但作為防錯，我們仍然儲存 AI 的狀態
                             db.save_current_task(new_task_list_from_ai)
+                            context = context.with_active_tasks(new_task_list_from_ai)
                             logger.warning("AI processed COMPLETE_TASK but no task was marked as COMPLETED in the response.")
                             self.error_info.emit("無法確認完成的任務，但狀態已更新。")
                     else:
-                        self.error_info.emit("AI 狀態控制器處理失敗，無法完成任務。")
+                        self.error_info.emit("狀態控制器處理失敗，無法完成任務。")
 
                 case "QUERY_TASK":
                     # 修正：使用者查詢時，除了回話，也要更新日曆視圖
-                    self.fetch_and_emit_calendar() 
-                    subtasks = db.get_current_task() or []
+                    await self.fetch_and_emit_calendar_async(context=context)
+                    subtasks = context.tasks()
                     self.user_msg.emit("正在為您查詢今天的行程...")
 
 task_state_manager = TaskStateManager()
\ No newline at end of file
@@ -0,0 +1,92 @@
+import uuid
+from utils.logger import logger
+from utils.helper import parse_event_time, same_name
+
+STATUSES = {"IN_PROGRESS", "PAUSED", "COMPLETED"}
+INTERNAL_FIELDS = ("_internal_pause_start_time", "_internal_total_paused_seconds")
+# 允許由狀態控制器修改的欄位與其型別檢查
+FIELD_CHECKS = {
+    "summary": lambda v : isinstance(v, str) and v.strip() != "",
+    "status": lambda v : v in STATUSES,
+    "start": lambda v : parse_event_time(v) is not None,
+    "end": lambda v : parse_event_time(v) is not None,
+    "duration": lambda v : isinstance(v, (int, float)) and not isinstance(v, bool) and v >= 0,
+    "pause_reason": lambda v : v is None or isinstance(v, str),
+    "_internal_pause_start_time": lambda v : v is None or parse_event_time(v) is not None,
+    "_internal_total_paused_seconds": lambda v : isinstance(v, (int, float)) and not isinstance(v, bool) and v >= 0,
+}
+
+def validate_patch(patch: dict, tasks: list) -> str | None :
+    """Check a `{op, task_id, changes}` patch from the state controller.
+
+    Args:
+        patch (dict): Patch returned by the model.
+        tasks (list): Active tasks the patch applies to.
+
+    Returns:
+        str | None: Why the patch is invalid, or None if it can be applied.
+    """
+    if not isinstance(patch, dict) :
+        return "patch is not an object"
+    op = patch.get("op")
+    if op == "none" :
+        return None
+    if op not in ("update", "create") :
+        return f"unknown op {op!r}"
+
+    changes = patch.get("changes")
+    if not isinstance(changes, dict) or not changes :
+        return "changes must be a non-empty object"
+    for field, value in changes.items() :
+        check = FIELD_CHECKS.get(field)
+        if check is None :
+            return f"field {field!r} may not be changed"
+        if not check(value) :
+            return f"invalid value for {field!r}: {value!r}"
+
+    task_ids = {t.get("task_id") for t in tasks if t.get("status") != "COMPLETED"}
+    if op == "update" and patch.get("task_id") not in task_ids :
+        return f"task {patch.get('task_id')!r} is not active"
+    if op == "create" :
+        if patch.get("task_id") in task_ids :
+            return f"task {patch.get('task_id')!r} already exists"
+        if any(same_name(t.get("summary", ""), changes.get("summary")) for t in tasks if t.get("status") != "COMPLETED") :
+            return f"task {changes.get('summary')!r} is already active"
+        if not changes.get("summary") or changes.get("status") != "IN_PROGRESS" :
+            return "a created task needs a summary and status IN_PROGRESS"
+    return None
+
+def apply_patch(tasks: list, patch: dict) -> list | None :
+    """Validate a patch and apply it in place, following the state controller contract.
+
+    Tasks already COMPLETED before the patch are dropped; a task completed by the patch keeps
+    status "COMPLETED" in the returned list (without its internal fields) so it can be archived.
+
+    Returns:
+        list | None: The updated task list, or None if the patch is invalid or targets nothing.
+    """
+    error = validate_patch(patch, tasks)
+    if error :
+        logger.error(f"Rejected state controller patch ({error}): {patch}")
+        return None
+    if patch["op"] == "none" :
+        logger.warning("State controller could not find the target task.")
+        return None
+
+    tasks[:] = [t for t in tasks if t.get("status") != "COMPLETED"]
+    changes = patch["changes"]
+
+    if patch["op"] == "create" :
+        task = {"task_id": patch.get("task_id") or str(uuid.uuid4()),
+                "pause_reason": None,
+                "_internal_pause_start_time": None,
+                "_internal_total_paused_seconds": 0}
+        tasks.append(task)
+    else :
+        task = next(t for t in tasks if t.get("task_id") == patch["task_id"])
+
+    task.update(changes)
+    if task.get("status") == "COMPLETED" :
+        for field in INTERNAL_FIELDS :
+            task.pop(field, None)
+    return tasks
@@ -0,0 +1,165 @@
+import io
+import re
+import threading
+from pathlib import Path
+import numpy as np
+from config import config
+from utils.logger import logger
+from utils.helper import TAIPEI_TZ, atomic_write_bytes, parse_event_time
+
+# 依任務名稱關鍵字粗略分類，用來統計各類任務的實際時長
+TASK_TYPES = ("writing", "study", "coding", "meeting", "exercise", "chore", "other")
+TASK_TYPE_PATTERNS = { # checked in order, so 寫程式 counts as coding rather than writing
+    "study": re.compile(r"讀|念書|複習|預習|考試|作業|閱讀|study|read|review|homework|exam", re.IGNORECASE),
+    "coding": re.compile(r"程式|寫扣|code|coding|debug|bug|deploy|program", re.IGNORECASE),
+    "writing": re.compile(r"寫|報告|作文|論文|文章|心得|write|essay|report|paper|draft", re.IGNORECASE),
+    "meeting": re.compile(r"會議|開會|討論|面談|meeting|call|sync|interview", re.IGNORECASE),
+    "exercise": re.compile(r"運動|健身|跑步|游泳|瑜伽|gym|run|workout|exercise|yoga", re.IGNORECASE),
+    "chore": re.compile(r"打掃|洗|整理|買|繳|家事|clean|laundry|shop|errand|pay", re.IGNORECASE),
+}
+ARRAYS = ("starts", "completions", "pauses", "overruns", "type_count", "type_mean", "type_m2", "type_overrun")
+
+def task_type(summary: str | None) -> str :
+    for name, pattern in TASK_TYPE_PATTERNS.items() :
+        if summary and pattern.search(summary) :
+            return name
+    return "other"
+
+class BehaviourProfile :
+    """Weekday x hour-of-day histograms and per task type duration stats of archived tasks.
+
+    Updated incrementally from `DBManager.archive_task`, so reading it costs the same however long
+    the history is. Arrays (saved as `DATA_DIR/behaviour_profile.npz`):
+        starts, completions, pauses, overruns: (7, 24) counts by the weekday/hour the task started
+            (pauses by the weekday/hour of each PAUSE log entry).
+        type_count, type_mean, type_m2: (len(TASK_TYPES),) running duration stats in minutes (Welford).
+        type_overrun: (len(TASK_TYPES),) tasks that took longer than planned.
+    """
+    def __init__(self, filepath: Path | None = None) :
+        self.filepath = filepath or config.DATA_DIR / "behaviour_profile.npz"
+        self.lock = threading.Lock()
+        self._reset()
+        self._load()
+
+    def _reset(self) :
+        self.starts = np.zeros((7, 24), dtype = np.int32)
+        self.completions = np.zeros((7, 24), dtype = np.int32)
+        self.pauses = np.zeros((7, 24), dtype = np.int32)
+        self.overruns = np.zeros((7, 24), dtype = np.int32)
+        self.type_count = np.zeros(len(TASK_TYPES), dtype = np.int32)
+        self.type_mean = np.zeros(len(TASK_TYPES), dtype = np.float64)
+        self.type_m2 = np.zeros(len(TASK_TYPES), dtype = np.float64)
+        self.type_overrun = np.zeros(len(TASK_TYPES), dtype = np.int32)
+
+    def _load(self) :
+        if not self.filepath.exists() :
+            return
+        try :
+            with np.load(self.filepath) as data :
+                for name in ARRAYS :
+                    if data[name].shape == getattr(self, name).shape :
+                        setattr(self, name, data[name].astype(getattr(self, name).dtype))
+        except Exception as e :
+            logger.error(f"Read behaviour profile failed, starting from an empty profile: {e}")
+            self._reset()
+
+    def _save(self) :
+        buffer = io.BytesIO()
+        try :
+            np.savez(buffer, **{name: getattr(self, name) for name in ARRAYS})
+            atomic_write_bytes(self.filepath, buffer.getvalue())
+        except Exception as e :
+            logger.error(f"Write behaviour profile failed: {e}")
+
+    @property
+    def total(self) -> int :
+        return int(self.starts.sum())
+
+    def _add(self, task: dict) :
+        start = parse_event_time(task.get("start") or task.get("start_time"))
+        if start is None :
+            return
+        start = start.astimezone(TAIPEI_TZ)
+        cell = (start.weekday(), start.hour)
+        self.starts[cell] += 1
+        if task.get("status") == "COMPLETED" :
+            self.completions[cell] += 1
+        for log in task.get("logs") or [] :
+            pause_time = parse_event_time(log.get("time")) if log.get("event") == "PAUSE" else None
+            if pause_time is not None :
+                pause_time = pause_time.astimezone(TAIPEI_TZ)
+                self.pauses[pause_time.weekday(), pause_time.hour] += 1
+
+        duration = task.get("duration")
+        if not isinstance(duration, (int, float)) or isinstance(duration, bool) :
+            return
+        index = TASK_TYPES.index(task_type(task.get("summary")))
+        self.type_count[index] += 1
+        delta = duration - self.type_mean[index]
+        self.type_mean[index] += delta / self.type_count[index]
+        self.type_m2[index] += delta * (duration - self.type_mean[index])
+        planned = task.get("planned_minutes")
+        if isinstance(planned, (int, float)) and planned > 0 and duration > planned :
+            self.overruns[cell] += 1
+            self.type_overrun[index] += 1
+
+    def update(self, task: dict) :
+        """Add one archived task and persist the profile."""
+        with self.lock :
+            self._add(task)
+            self._save()
+
+    def rebuild(self, tasks: list) :
+        """Recompute the profile from a full history, e.g. when the profile file does not exist yet."""
+        with self.lock :
+            self._reset()
+            for task in tasks :
+                self._add(task)
+            self._save()
+        logger.info(f"Behaviour profile rebuilt from {len(tasks)} archived tasks.")
+
+    def snapshot(self) -> dict :
+        """Copies of the histograms, for scoring without holding the lock."""
+        with self.lock :
+            return {name: getattr(self, name).copy() for name in ARRAYS}
+
+    def summary(self, top: int = 3) -> dict :
+        """Small fixed-size description of the profile for prompts.
+
+        Hours are ranked by smoothed completion and pause rates over all weekdays and split at the
+        overall pause rate; task types are listed only when they have data.
+        """
+        data = self.snapshot()
+        starts = data["starts"].sum(axis = 0)
+        if not starts.sum() :
+            return {"tasks": 0}
+        completion_rate = (data["completions"].sum(axis = 0) + 1) / (starts + 2)
+        pause_rate = (data["pauses"].sum(axis = 0) + 1) / (starts + 2)
+        active = np.flatnonzero(starts)
+        # 暫停率低於整體平均的小時算順暢時段，高於平均的算高阻力時段
+        overall = (data["pauses"].sum() + 1) / (starts.sum() + 2)
+        ranked = active[np.argsort(pause_rate[active] - completion_rate[active], kind = "stable")]
+        flow = [h for h in ranked if pause_rate[h] < overall][:top]
+        friction = [h for h in ranked[::-1] if pause_rate[h] > overall][:top]
+        weekday_starts = data["starts"].sum(axis = 1)
+
+        types = {}
+        for index, name in enumerate(TASK_TYPES) :
+            count = int(data["type_count"][index])
+            if count :
+                std = (data["type_m2"][index] / (count - 1)) ** 0.5 if count > 1 else 0.0
+                types[name] = {"n": count,
+                               "mean_minutes": round(float(data["type_mean"][index])),
+                               "std_minutes": round(float(std)),
+                               "overrun_rate": round(float(data["type_overrun"][index]) / count, 2)}
+        return {
+            "tasks": int(starts.sum()),
+            "flow_hours": [f"{h:02d}:00" for h in flow],
+            "friction_hours": [f"{h:02d}:00" for h in friction],
+            "hourly": {f"{h:02d}": [int(starts[h]), round(float(completion_rate[h]), 2), round(float(pause_rate[h]), 2)] for h in active},
+            "busiest_weekday": int(weekday_starts.argmax()),
+            "overrun_rate": round(float(data["overruns"].sum()) / int(starts.sum()), 2),
+            "task_types": types,
+        }
+
+behaviour_profile = BehaviourProfile()
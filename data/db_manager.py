@@ -1,5 +1,7 @@
+import copy
 import json
 import os
+import atexit
 import shutil
 import threading
 import datetime
@@ -7,6 +9,9 @@ from pathlib import Path
 from dateutil.relativedelta import relativedelta
 from config import config
 from utils.logger import logger
+from utils.helper import atomic_write_text
+from data.behaviour_profile import behaviour_profile
+from data.similarity_index import similarity_index
 
 class DBManager :
     def __init__(self):
@@ -15,6 +20,72 @@ class DBManager :
         self.subtask_json = config.DATA_DIR / "subtask.json"
         self.history_dir.mkdir(parents=True, exist_ok=True)
         self.lock = threading.Lock()
+        # 記憶體中的檔案內容 {filepath: ((mtime_ns, size) | None, data)}，檔案被外部修改時依 mtime/size 失效
+        self._cache = {}
+        self._dirty = set()
+        self._flush_timer = None
+        atexit.register(self.flush)
+        
+        self._bootstrap_indexes()
+        if config.HISTORY_COMPACT_ON_START :
+            threading.Thread(target = self.compact_history, daemon = True, name = "history-compaction").start()
+    
+    def _bootstrap_indexes(self) :
+        # 行為檔案或相似度索引還不存在時 (第一次啟動或剛升級)，從既有的歷史紀錄建立一次
+        missing = [index for index in (behaviour_profile, similarity_index) if not index.filepath.exists()]
+        if missing:
+            history = self._all_history()
+            if history:
+                for index in missing:
+                    index.rebuild(history)
+    
+    def _history_files(self) -> list[Path] :
+        # 每月的歷史檔：舊格式 YYYY-M.json 與追加式的 YYYY-M.jsonl，排除同目錄下的相似度索引
+        files = [f for f in self.history_dir.glob("*-*.json*") if f.suffix in (".json", ".jsonl") and f != similarity_index.filepath]
+        return sorted(files, key = lambda f : (tuple(int(part) for part in f.stem.split("-") if part.isdigit()), f.suffix))
+    
+    @staticmethod
+    def _month_of(filepath: Path) -> tuple[int, int] | None :
+        """(year, month) of a `YYYY-M` history file name, or None for any other file."""
+        try :
+            year, month = (int(part) for part in filepath.stem.split("-"))
+        except ValueError :
+            return None
+        return (year, month) if 1 <= month <= 12 else None
+    
+    def _month_files(self, year: int, month: int) -> tuple[Path, Path] :
+        """(legacy JSON array, append-only JSONL log) of one month."""
+        return self.history_dir / f"{year}-{month}.json", self.history_dir / f"{year}-{month}.jsonl"
+    
+    def _read_history_file(self, filepath: Path) :
+        """Yield the tasks of one history file without loading a JSONL log at once.
+
+        A line that does not parse (e.g. half written when the app crashed) is skipped.
+        """
+        if not filepath.exists() :
+            return
+        if filepath.suffix == ".json" :
+            yield from self._load_json(filepath) or []
+            return
+        try :
+            with open(filepath, "r", encoding = "utf-8") as f :
+                for line_number, line in enumerate(f, 1) :
+                    if not line.strip() :
+                        continue
+                    try :
+                        yield json.loads(line)
+                    except json.JSONDecodeError :
+                        logger.warning(f"Skip unreadable history entry {filepath.name}:{line_number}")
+        except Exception as e :
+            logger.error(f"Read history log failed: {e}")
+    
+    def _all_history(self) -> list :
+        return [task for f in self._history_files() for task in self._read_history_file(f)]
+    
+    def _index_archived(self, data: dict) :
+        # 增量更新行為統計與相似度索引，排程時不必再分析完整的歷史紀錄
+        behaviour_profile.update(data)
+        similarity_index.add(data)
     
     def _load_json(self, filepath: Path) :
         with self.lock :
@@ -25,46 +96,133 @@ class DBManager :
                 logger.error(f"Read json file failed: {e}")
                 return None
     
-    def _save_json(self, filepath: Path, data: dict) :
+    def _write_json(self, filepath: Path, data) -> bool :
+        # 呼叫端需持有 self.lock
+        try :
+            atomic_write_text(filepath, json.dumps(data, ensure_ascii = False, indent = 4))
+            return True
+        except Exception as e :
+            logger.error(f"Write json file error: {e}")
+            return False
+    
+    @staticmethod
+    def _stamp(filepath: Path) -> tuple | None :
+        try :
+            stat = filepath.stat()
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError :
+            return None
+    
+    def _read_cached(self, filepath: Path) :
+        """File content from memory, re-read only when the file changed on disk.
+
+        Returns a copy, so callers can modify it without touching the cache.
+        """
         with self.lock :
-            try :
-                with open(filepath, "w", encoding = "utf-8") as f :
-                    json.dump(data, f, ensure_ascii = False, indent = 4)
-            except Exception as e :
-                logger.error(f"Write json file error: {e}")
+            if filepath not in self._dirty :
+                stamp = self._stamp(filepath)
+                if filepath not in self._cache or self._cache[filepath][0] != stamp :
+                    data = None
+                    if stamp is not None :
+                        try :
+                            with open(filepath, "r", encoding = "utf-8") as f :
+                                data = json.load(f)
+                        except Exception as e :
+                            logger.error(f"Read json file failed: {e}")
+                    self._cache[filepath] = (stamp, data)
+            return copy.deepcopy(self._cache[filepath][1])
+    
+    def _write_cached(self, filepath: Path, data) :
+        """Update memory now and write the file after `config.DB_FLUSH_DELAY` seconds.
+
+        Saves made before the flush runs are coalesced into one write.
+        """
+        with self.lock :
+            self._cache[filepath] = (None, copy.deepcopy(data))
+            self._dirty.add(filepath)
+            if config.DB_FLUSH_DELAY <= 0 :
+                self._flush_locked()
+            elif self._flush_timer is None :
+                self._flush_timer = threading.Timer(config.DB_FLUSH_DELAY, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def _flush_locked(self) :
+        for filepath in list(self._dirty) :
+            data = self._cache[filepath][1]
+            if self._write_json(filepath, data) :
+                self._cache[filepath] = (self._stamp(filepath), data)
+                self._dirty.discard(filepath)
+    
+    def flush(self) :
+        """Write pending saves to disk. Also runs at interpreter exit."""
+        with self.lock :
+            if self._flush_timer is not None :
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._flush_locked()
     
     def get_subtask(self, task_id: str) :
         # 修正：先檢查 data 是否為 None，避免 AttributeError
-        data = self._load_json(self.subtask_json)
+        data = self._read_cached(self.subtask_json)
         if data:
             return data.get(task_id, None)
         return None
     
     def save_subtask(self, data: dict) :
-        self._save_json(self.subtask_json, data)
+        self._write_cached(self.subtask_json, data)
     
     def get_current_task(self) -> dict | None :
-        data = self._load_json(self.current_task_file)
+        data = self._read_cached(self.current_task_file)
         if data :
             return data
         else :
             return None
     
     def save_current_task(self, data: dict) :
-        self._save_json(self.current_task_file, data)
+        self._write_cached(self.current_task_file, data)
     
     def archive_task(self, data: dict) :
+        """Append one task to this month's history log.
+
+        The log is only appended to, so archiving costs the same at the first task of the month
+        and at the ten thousandth, and a crash can at most lose the line being written.
+        """
         now = datetime.datetime.now()
-        filepath = self.history_dir / f"{now.year}-{now.month}.json"
-        
-        # 核心修正：明確檢查檔案是否存在，如果不存在，則先建立一個包含空列表的檔案。
-        # 這讓後續的讀取-修改-寫入流程更加穩健，並直接回應了使用者的需求。
-        if not filepath.exists():
-            self._save_json(filepath, [])
+        _, filepath = self._month_files(now.year, now.month)
+        line = json.dumps(data, ensure_ascii = False, separators = (",", ":")) + "\n"
+        with self.lock :
+            try :
+                with open(filepath, "a+b") as f :
+                    # 上次寫到一半就當機時補上換行，避免新紀錄接在殘缺的那一行後面
+                    if f.tell() :
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b"\n" :
+                            line = "\n" + line
+                    f.write(line.encode("utf-8"))
+                    f.flush()
+                    if config.HISTORY_FSYNC :
+                        os.fsync(f.fileno())
+            except Exception as e :
+                logger.error(f"Append history log failed: {e}")
+                return
+        self._index_archived(data)
+    
+    def iter_history(self, long: int) :
+        """Stream task history, the current month first, one task at a time.
 
-        history_list = self._load_json(filepath) or []
-        history_list.append(data)
-        self._save_json(filepath, history_list)
+        Args:
+            long (int): How many month history you want to get.
+
+        Yields:
+            dict: Archived task.
+        """
+        now = datetime.datetime.now()
+        for target in range(long) :
+            # 修正：relativedelta(month = n) 是把月份「設為」n，往前推 n 個月要用 months
+            target_date = now - relativedelta(months = target)
+            for filepath in self._month_files(target_date.year, target_date.month) :
+                yield from self._read_history_file(filepath)
     
     def get_history(self, long: int) -> list | None :
         """Get task history
@@ -75,19 +233,59 @@ class DBManager :
         Returns:
             list: Tasks list.
         """
-        data = []
-        for target in range(long) :
-            target_date = datetime.datetime.now() - relativedelta(month = target)
-            filepath = self.history_dir / f"{target_date.year}-{target_date.month}.json"
-            # 修正：使用正確的 filepath 物件來讀取檔案，而不是僅用檔名字串。
-            # 同時只加入成功讀取的歷史資料，並使用 extend 將多個月份的任務合併成一個扁平列表。
-            loaded_data = self._load_json(filepath)
-            if loaded_data:
-                data.extend(loaded_data)
+        data = list(self.iter_history(long))
         
         if data :
             return data
         else :
             return None
+    
+    def compact_history(self) :
+        """Rewrite each month as one clean JSONL log.
+
+        Folds a legacy `YYYY-M.json` array into the month's log and drops unreadable lines.
+        Months that are already clean are left untouched.
+        """
+        months = set()
+        for filepath in self._history_files() :
+            month = self._month_of(filepath)
+            if month is None :
+                logger.warning(f"Skip unexpected history file: {filepath.name}")
+                continue
+            months.add(month)
+        for year, month in sorted(months) :
+            legacy, log = self._month_files(year, month)
+            with self.lock :
+                tasks, dropped = [], 0
+                if log.exists() :
+                    for line in log.read_text(encoding = "utf-8").splitlines() :
+                        try :
+                            if line.strip() :
+                                tasks.append(json.loads(line))
+                        except json.JSONDecodeError :
+                            dropped += 1
+                if not legacy.exists() and not dropped :
+                    continue
+                if legacy.exists() :
+                    try :
+                        with open(legacy, "r", encoding = "utf-8") as f :
+                            # 舊格式的紀錄比追加檔早，放在前面
+                            tasks = json.load(f) + tasks
+                    except Exception as e :
+                        logger.error(f"Read legacy history {legacy.name} failed, keeping it: {e}")
+                        continue
+                try :
+                    atomic_write_text(log, "".join(json.dumps(task, ensure_ascii = False, separators = (",", ":")) + "\n" for task in tasks), fsync = True)
+                    legacy.unlink(missing_ok = True)
+                    logger.info(f"Compacted history {year}-{month}: {len(tasks)} tasks, {dropped} unreadable lines dropped.")
+                except Exception as e :
+                    logger.error(f"Compact history {year}-{month} failed: {e}")
+
+def _create_db() -> DBManager :
+    # 依設定選擇儲存後端，預設沿用 JSON 檔案
+    if config.DB_BACKEND == "sqlite" :
+        from data.sqlite_manager import SQLiteDBManager
+        return SQLiteDBManager()
+    return DBManager()
 
-db = DBManager()
\ No newline at end of file
+db = _create_db()
\ No newline at end of file
@@ -0,0 +1,195 @@
+import json
+import time
+import bisect
+import datetime
+import threading
+from pathlib import Path
+from config import config
+from utils.logger import logger
+from utils.helper import TAIPEI_TZ, atomic_write_text, event_bounds
+
+class EventStore :
+    """Local copy of the Google Calendar events, kept current with `syncToken` incremental sync.
+
+    Layout of the store file:
+        {calendar_key: {"sync_token": str, "time_min": str, "time_max": str, "synced_at": float, "events": {event_id: event}}}
+
+    The store only covers [time_min, time_max): events ending before the rolling lookback
+    (`CALENDAR_SYNC_LOOKBACK_DAYS`) are dropped after every sync, and events starting after `time_max`
+    are never kept. Queries use an in-memory index of epoch bounds sorted by start time, built once per
+    calendar and updated per changed event, so a read never re-parses the stored events.
+    """
+    def __init__(self, filepath: Path | None = None):
+        self.filepath = filepath or config.DATA_DIR / "calendar_events.json"
+        self.lock = threading.RLock()
+        self._data = self._load()
+        self._bounds = {} # calendar_key -> {event_id: (start, end)} in epoch seconds
+        self._index = {} # calendar_key -> (starts, [(start, end, event_id)], longest duration), None once stale
+
+    def _load(self) -> dict :
+        if not self.filepath.exists() :
+            return {}
+        try :
+            with open(self.filepath, "r", encoding = "utf-8") as f :
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e :
+            logger.error(f"Read event store failed, starting from an empty store: {e}")
+            return {}
+
+    def _save(self) :
+        try :
+            atomic_write_text(self.filepath, json.dumps(self._data, ensure_ascii = False, separators = (",", ":")))
+        except Exception as e :
+            logger.error(f"Write event store failed: {e}")
+
+    def get_sync_token(self, calendar_key: str) -> str | None :
+        with self.lock :
+            return self._data.get(calendar_key, {}).get("sync_token")
+
+    def get_time_min(self, calendar_key: str) -> str | None :
+        with self.lock :
+            return self._data.get(calendar_key, {}).get("time_min")
+
+    def get_time_max(self, calendar_key: str) -> str | None :
+        with self.lock :
+            return self._data.get(calendar_key, {}).get("time_max")
+
+    def is_fresh(self, calendar_key: str, max_age: float) -> bool :
+        """Whether the calendar was synced less than `max_age` seconds ago."""
+        with self.lock :
+            synced_at = self._data.get(calendar_key, {}).get("synced_at")
+            return synced_at is not None and time.time() - synced_at < max_age
+
+    def replace(self, calendar_key: str, events: list, sync_token: str | None, time_min: str, time_max: str) :
+        """Replace a calendar's events after a full sync of [time_min, time_max)."""
+        with self.lock :
+            self._data[calendar_key] = {
+                "sync_token": sync_token,
+                "time_min": time_min,
+                "time_max": time_max,
+                "synced_at": time.time(),
+                "events": {e["id"]: e for e in events if e.get("id") and e.get("status") != "cancelled"},
+            }
+            self._bounds.pop(calendar_key, None)
+            self._index.pop(calendar_key, None)
+            self._prune(calendar_key)
+            self._save()
+
+    def apply_changes(self, calendar_key: str, changes: list, sync_token: str | None) :
+        """Merge an incremental sync result: cancelled events are removed, the rest upserted."""
+        with self.lock :
+            entry = self._data.setdefault(calendar_key, {"events": {}})
+            events = entry.setdefault("events", {})
+            for event in changes :
+                event_id = event.get("id")
+                if not event_id :
+                    continue
+                if event.get("status") == "cancelled" :
+                    events.pop(event_id, None)
+                else :
+                    events[event_id] = event
+                self._forget(calendar_key, event_id)
+            entry["sync_token"] = sync_token
+            entry["synced_at"] = time.time()
+            if self._prune(calendar_key) or changes :
+                self._save()
+
+    def upsert(self, calendar_key: str, event: dict) :
+        """Insert an event we created ourselves so it shows up before the next sync."""
+        with self.lock :
+            if calendar_key not in self._data or not event.get("id") :
+                return
+            self._data[calendar_key].setdefault("events", {})[event["id"]] = event
+            self._forget(calendar_key, event["id"])
+            self._save()
+
+    def clear(self, calendar_key: str) :
+        with self.lock :
+            self._bounds.pop(calendar_key, None)
+            self._index.pop(calendar_key, None)
+            if self._data.pop(calendar_key, None) is not None :
+                self._save()
+
+    def covers(self, calendar_key: str, start: datetime.datetime, end: datetime.datetime | None = None) -> bool :
+        """Whether the store holds this calendar's events from `start` (up to `end`)."""
+        with self.lock :
+            entry = self._data.get(calendar_key, {})
+            time_min, time_max = entry.get("time_min"), entry.get("time_max")
+        if time_min is None or datetime.datetime.fromisoformat(time_min) > start :
+            return False
+        return end is None or time_max is None or end <= datetime.datetime.fromisoformat(time_max)
+
+    def query(self, calendar_key: str, start: datetime.datetime, end: datetime.datetime) -> list :
+        """Return copies of the events overlapping [start, end), ordered by start time.
+
+        Overlap follows the Calendar API's `timeMin`/`timeMax` semantics.
+        """
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        with self.lock :
+            events = self._data.get(calendar_key, {}).get("events", {})
+            starts, rows, longest = self._sorted(calendar_key)
+            # 依開始時間二分搜尋；最長事件的長度決定往前需要多看多少筆
+            low = bisect.bisect_left(starts, start_ts - longest)
+            high = bisect.bisect_left(starts, end_ts)
+            return [dict(events[event_id]) for _, event_end, event_id in rows[low:high] if event_end > start_ts]
+
+    def _event_bounds(self, calendar_key: str) -> dict :
+        """{event_id: (start, end)} of the default events, parsed once per event."""
+        bounds = self._bounds.get(calendar_key)
+        if bounds is None :
+            bounds = self._bounds[calendar_key] = {}
+            for event_id in self._data.get(calendar_key, {}).get("events", {}) :
+                self._parse(calendar_key, event_id)
+        return bounds
+
+    def _parse(self, calendar_key: str, event_id: str) :
+        bounds = self._bounds[calendar_key]
+        event = self._data.get(calendar_key, {}).get("events", {}).get(event_id)
+        parsed = event_bounds(event) if event and event.get("eventType", "default") == "default" else None
+        if parsed is None :
+            bounds.pop(event_id, None)
+        else :
+            bounds[event_id] = (parsed[0].timestamp(), parsed[1].timestamp())
+
+    def _forget(self, calendar_key: str, event_id: str) :
+        """Re-parse one changed event and mark the sorted index stale."""
+        if calendar_key in self._bounds :
+            self._parse(calendar_key, event_id)
+        self._index[calendar_key] = None
+
+    def _sorted(self, calendar_key: str) -> tuple :
+        index = self._index.get(calendar_key)
+        if index is None :
+            rows = sorted((event_start, event_end, event_id) for event_id, (event_start, event_end) in self._event_bounds(calendar_key).items())
+            longest = max((event_end - event_start for event_start, event_end, _ in rows), default = 0.0)
+            index = self._index[calendar_key] = ([row[0] for row in rows], rows, longest)
+        return index
+
+    def _prune(self, calendar_key: str) -> bool :
+        """Drop events outside [now - lookback, time_max) and move `time_min` up to the lookback.
+
+        Returns:
+            bool: Whether anything changed.
+        """
+        entry = self._data.get(calendar_key)
+        if not entry or entry.get("time_min") is None :
+            return False
+        cutoff = (datetime.datetime.now(TAIPEI_TZ) - datetime.timedelta(days = config.CALENDAR_SYNC_LOOKBACK_DAYS)).replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+        time_max = datetime.datetime.fromisoformat(entry["time_max"]).timestamp() if entry.get("time_max") else float("inf")
+        cutoff_ts = cutoff.timestamp()
+        events = entry.get("events", {})
+        stale = [event_id for event_id, (event_start, event_end) in self._event_bounds(calendar_key).items()
+                 if event_end < cutoff_ts or event_start >= time_max]
+        for event_id in stale :
+            events.pop(event_id, None)
+            self._bounds[calendar_key].pop(event_id, None)
+        if stale :
+            self._index[calendar_key] = None
+
+        moved = datetime.datetime.fromisoformat(entry["time_min"]) < cutoff
+        if moved :
+            entry["time_min"] = cutoff.isoformat(timespec = "seconds")
+        return bool(stale) or moved
+
+event_store = EventStore()
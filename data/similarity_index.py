@@ -0,0 +1,142 @@
+import re
+import json
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+from config import config
+from utils.logger import logger
+from utils.helper import atomic_write_text
+from utils.context_serializer import project_history
+
+NGRAM_SIZES = (2, 3)
+
+def _ngrams(text: str | None) -> Counter :
+    """Character n-grams of a task name; works for Chinese without word segmentation."""
+    normalized = re.sub(r"[\s\W_]+", "", str(text or "")).casefold()
+    grams = Counter()
+    if len(normalized) < min(NGRAM_SIZES) :
+        if normalized :
+            grams[normalized] += 1
+        return grams
+    for size in NGRAM_SIZES :
+        for i in range(len(normalized) - size + 1) :
+            grams[normalized[i:i + size]] += 1
+    return grams
+
+class SimilarityIndex :
+    """Character n-gram TF-IDF index over the names of archived tasks.
+
+    Persisted next to the monthly history logs as `history/similarity_index.jsonl`, one projected task
+    per line. Archiving only appends a line, and the inverted index {ngram: {doc index: term count}}
+    is rebuilt in memory on load; the idf weights and document norms are recomputed lazily on the
+    first search after a change.
+    """
+    def __init__(self, filepath: Path | None = None) :
+        self.filepath = filepath or config.DATA_DIR / "history" / "similarity_index.jsonl"
+        self.lock = threading.Lock()
+        self.docs = []
+        self.postings = {}
+        self._norms = None
+        self._load()
+
+    def _load(self) :
+        if not self.filepath.exists() :
+            return
+        try :
+            with open(self.filepath, "r", encoding = "utf-8") as f :
+                for line in f :
+                    try :
+                        self._index(json.loads(line))
+                    except json.JSONDecodeError :
+                        logger.warning("Skip unreadable similarity index entry.")
+        except Exception as e :
+            logger.error(f"Read similarity index failed, starting from an empty index: {e}")
+            self.docs, self.postings = [], {}
+
+    @staticmethod
+    def _line(doc: dict) -> str :
+        return json.dumps(doc, ensure_ascii = False, separators = (",", ":")) + "\n"
+
+    def _index(self, doc: dict) :
+        index = len(self.docs)
+        self.docs.append(doc)
+        for gram, count in _ngrams(doc.get("summary")).items() :
+            self.postings.setdefault(gram, {})[index] = count
+        self._norms = None
+
+    def add(self, task: dict) :
+        """Index one archived task and append it to the index file."""
+        doc = project_history(task)
+        with self.lock :
+            self._index(doc)
+            try :
+                self.filepath.parent.mkdir(parents = True, exist_ok = True)
+                with open(self.filepath, "a", encoding = "utf-8") as f :
+                    f.write(self._line(doc))
+            except Exception as e :
+                logger.error(f"Append similarity index failed: {e}")
+
+    def rebuild(self, tasks: list) :
+        """Index a full history from scratch."""
+        with self.lock :
+            self.docs, self.postings = [], {}
+            for task in tasks :
+                self._index(project_history(task))
+            try :
+                self.filepath.parent.mkdir(parents = True, exist_ok = True)
+                atomic_write_text(self.filepath, "".join(self._line(doc) for doc in self.docs))
+            except Exception as e :
+                logger.error(f"Write similarity index failed: {e}")
+        logger.info(f"Similarity index rebuilt from {len(tasks)} archived tasks.")
+
+    def _idf(self, gram: str) -> float :
+        return math.log((len(self.docs) + 1) / (len(self.postings.get(gram, ())) + 1)) + 1
+
+    def _doc_norms(self) -> list[float] :
+        if self._norms is None :
+            squares = [0.0] * len(self.docs)
+            for gram, docs in self.postings.items() :
+                idf = self._idf(gram)
+                for doc, count in docs.items() :
+                    squares[doc] += (count * idf) ** 2
+            self._norms = [math.sqrt(s) for s in squares]
+        return self._norms
+
+    def search(self, text: str | None, k: int | None = None, min_score: float | None = None) -> list[dict] :
+        """Archived tasks whose names are most similar to `text`.
+
+        Args:
+            text (str): Name of the new task.
+            k (int, optional): Maximum number of results. Defaults to `config.SIMILARITY_TOP_K`.
+            min_score (float, optional): Minimum cosine similarity. Defaults to `config.SIMILARITY_MIN_SCORE`.
+
+        Returns:
+            list[dict]: Projected tasks with a "similarity" field, best match first.
+        """
+        k = k if k is not None else config.SIMILARITY_TOP_K
+        min_score = min_score if min_score is not None else config.SIMILARITY_MIN_SCORE
+        query = _ngrams(text)
+        with self.lock :
+            if not query or not self.docs :
+                return []
+            norms = self._doc_norms()
+            scores = Counter()
+            query_norm = 0.0
+            for gram, count in query.items() :
+                weight = count * self._idf(gram)
+                query_norm += weight ** 2
+                for doc, doc_count in self.postings.get(gram, {}).items() :
+                    scores[doc] += weight * doc_count * self._idf(gram)
+            query_norm = math.sqrt(query_norm)
+
+            results = []
+            for doc, score in scores.items() :
+                similarity = score / (query_norm * norms[doc]) if norms[doc] else 0.0
+                if similarity >= min_score :
+                    results.append((similarity, doc))
+            # 相似度相同時，較新的紀錄優先
+            results.sort(key = lambda r : (-r[0], -r[1]))
+            return [dict(self.docs[doc], similarity = round(similarity, 2)) for similarity, doc in results[:k]]
+
+similarity_index = SimilarityIndex()
@@ -0,0 +1,201 @@
+import json
+import sqlite3
+import datetime
+from pathlib import Path
+from dateutil.relativedelta import relativedelta
+from config import config
+from utils.logger import logger
+from utils.helper import TAIPEI_TZ, parse_event_time
+from data.db_manager import DBManager
+from data.behaviour_profile import task_type
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS active_tasks (
+    position INTEGER PRIMARY KEY,
+    task_id TEXT,
+    status TEXT,
+    start TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_active_status ON active_tasks (status);
+CREATE TABLE IF NOT EXISTS subtasks (
+    task_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    month TEXT NOT NULL,
+    task_id TEXT,
+    summary TEXT,
+    status TEXT,
+    task_type TEXT,
+    start TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_month ON history (month);
+CREATE INDEX IF NOT EXISTS idx_history_status ON history (status, month);
+CREATE INDEX IF NOT EXISTS idx_history_type ON history (task_type, month);
+CREATE INDEX IF NOT EXISTS idx_history_start ON history (start);
+"""
+
+HISTORY_BATCH = 500 # rows fetched per query by iter_history
+
+def _dump(data) -> str :
+    return json.dumps(data, ensure_ascii = False, separators = (",", ":"))
+
+def _start_key(task: dict) -> str | None :
+    """Normalised ISO start time, so the start index sorts correctly across formats."""
+    start = parse_event_time(task.get("start") or task.get("start_time"))
+    return start.astimezone(TAIPEI_TZ).isoformat(timespec = "seconds") if start else None
+
+def _month_key(year: int, month: int) -> str :
+    return f"{year:04d}-{month:02d}"
+
+class SQLiteDBManager(DBManager) :
+    """`DBManager` backed by a single SQLite database in WAL mode (`DATA_DIR/tasks.db`).
+
+    Tables:
+        active_tasks: the current task list, one row per task in list order.
+        subtasks: {task_id: subtasks}.
+        history: archived tasks, indexed by month, status, task type and start time.
+    Every row keeps the full task as JSON in `data`; the other columns only exist to be indexed.
+    On first start the JSON files of `DBManager` are imported once and left in place.
+    """
+    def __init__(self, filepath: Path | None = None) :
+        self.filepath = filepath or config.DATA_DIR / "tasks.db"
+        # 連線由多個執行緒共用，所有存取都經過 self.lock
+        self.conn = sqlite3.connect(self.filepath, check_same_thread = False, isolation_level = None)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        super().__init__()
+
+    def _bootstrap_indexes(self) :
+        # 先把舊的 JSON 資料匯入，行為統計與相似度索引才能從資料庫重建
+        self._migrate_json()
+        super()._bootstrap_indexes()
+
+    def _execute(self, statements: list[tuple]) -> bool :
+        """Run several statements in one transaction."""
+        with self.lock :
+            try :
+                self.conn.execute("BEGIN IMMEDIATE")
+                for sql, params in statements :
+                    if isinstance(params, list) :
+                        self.conn.executemany(sql, params)
+                    else :
+                        self.conn.execute(sql, params)
+                self.conn.execute("COMMIT")
+                return True
+            except Exception as e :
+                self.conn.execute("ROLLBACK")
+                logger.error(f"Write database failed: {e}")
+                return False
+
+    def _query(self, sql: str, params: tuple = ()) -> list :
+        with self.lock :
+            try :
+                return self.conn.execute(sql, params).fetchall()
+            except Exception as e :
+                logger.error(f"Read database failed: {e}")
+                return []
+
+    def _history_row(self, month: str, task: dict) -> tuple :
+        return (month, task.get("task_id"), task.get("summary"), task.get("status"),
+                task_type(task.get("summary")), _start_key(task), _dump(task))
+
+    def _active_rows(self, tasks: list) -> list[tuple] :
+        return [(position, task.get("task_id"), task.get("status"), _start_key(task), _dump(task))
+                for position, task in enumerate(tasks or [])]
+
+    def _migrate_json(self) :
+        """Import current_task.json, subtask.json and the monthly history files once."""
+        if self._query("SELECT value FROM meta WHERE key = 'migrated_from_json'") :
+            return
+
+        history_rows = []
+        for filepath in self._history_files() :
+            try :
+                year, month = (int(part) for part in filepath.stem.split("-"))
+            except ValueError :
+                logger.warning(f"Skip unexpected history file: {filepath.name}")
+                continue
+            history_rows.extend(self._history_row(_month_key(year, month), task) for task in self._read_history_file(filepath))
+        current_tasks = self._load_json(self.current_task_file) if self.current_task_file.exists() else None
+        subtasks = self._load_json(self.subtask_json) if self.subtask_json.exists() else None
+
+        statements = [("DELETE FROM active_tasks", ()),
+                      ("DELETE FROM subtasks", ()),
+                      ("DELETE FROM history", ()),
+                      ("INSERT INTO active_tasks (position, task_id, status, start, data) VALUES (?, ?, ?, ?, ?)", self._active_rows(current_tasks)),
+                      ("INSERT INTO subtasks (task_id, data) VALUES (?, ?)", [(task_id, _dump(value)) for task_id, value in (subtasks or {}).items()]),
+                      ("INSERT INTO history (month, task_id, summary, status, task_type, start, data) VALUES (?, ?, ?, ?, ?, ?, ?)", history_rows),
+                      ("INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)", (datetime.datetime.now().isoformat(timespec = "seconds"),))]
+        if self._execute(statements) :
+            logger.info(f"Migrated JSON data to SQLite: {len(current_tasks or [])} active tasks, {len(subtasks or {})} subtasks, {len(history_rows)} history entries.")
+
+    def _all_history(self) -> list :
+        return [json.loads(data) for data, in self._query("SELECT data FROM history ORDER BY id")]
+
+    def get_subtask(self, task_id: str) :
+        rows = self._query("SELECT data FROM subtasks WHERE task_id = ?", (task_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def save_subtask(self, data: dict) :
+        self._execute([("DELETE FROM subtasks", ()),
+                       ("INSERT INTO subtasks (task_id, data) VALUES (?, ?)", [(task_id, _dump(value)) for task_id, value in (data or {}).items()])])
+
+    def get_current_task(self) -> list | None :
+        rows = self._query("SELECT data FROM active_tasks ORDER BY position")
+        return [json.loads(data) for data, in rows] or None
+
+    def save_current_task(self, data: list) :
+        self._execute([("DELETE FROM active_tasks", ()),
+                       ("INSERT INTO active_tasks (position, task_id, status, start, data) VALUES (?, ?, ?, ?, ?)", self._active_rows(data))])
+
+    def archive_task(self, data: dict) :
+        now = datetime.datetime.now()
+        if self._execute([("INSERT INTO history (month, task_id, summary, status, task_type, start, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           self._history_row(_month_key(now.year, now.month), data))]) :
+            self._index_archived(data)
+
+    def compact_history(self) :
+        """Fold the WAL back into the database file; SQLite needs no other compaction."""
+        with self.lock :
+            try :
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            except Exception as e :
+                logger.error(f"Checkpoint database failed: {e}")
+
+    def iter_history(self, long: int) :
+        """Stream task history from the `history` table, the current month first.
+
+        Rows are fetched in batches of `HISTORY_BATCH`, continuing after the last (month, id) seen,
+        so the lock is not held while the caller consumes the tasks and `get_history` (built on this
+        method in `DBManager`) returns the same tasks.
+
+        Args:
+            long (int): How many month history you want to get.
+
+        Yields:
+            dict: Archived task.
+        """
+        if long < 1 :
+            return
+        first = datetime.datetime.now() - relativedelta(months = long - 1)
+        first_month = _month_key(first.year, first.month)
+        rows = self._query("SELECT id, month, data FROM history WHERE month >= ? ORDER BY month DESC, id LIMIT ?",
+                           (first_month, HISTORY_BATCH))
+        while rows :
+            for _, _, data in rows :
+                yield json.loads(data)
+            if len(rows) < HISTORY_BATCH :
+                return
+            last_id, last_month = rows[-1][0], rows[-1][1]
+            rows = self._query("SELECT id, month, data FROM history WHERE month >= ? AND (month < ? OR (month = ? AND id > ?)) "
+                               "ORDER BY month DESC, id LIMIT ?",
+                               (first_month, last_month, last_month, last_id, HISTORY_BATCH))
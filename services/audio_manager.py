@@ -1,25 +1,180 @@
-import os
+import re
+import time
 import wave
-import uuid
+import atexit
+import datetime
+import threading
+import dataclasses
 import pyaudio
-import whisper
-from pathlib import Path
-from config import config, ROOT_DIR
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from config import config
 from utils.logger import logger
 
 AUDIO_CHUNK = 1024
+AUDIO_RATE = 16000
+# 中日文字與全形標點之間不需要空格
+_CJK = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+def _join_segments(texts: list[str]) -> str :
+    """Join the texts of consecutive segments, with a space unless both sides of the boundary are CJK."""
+    joined = ""
+    for text in texts :
+        text = text.strip()
+        if not text :
+            continue
+        if joined and not (_CJK.match(joined[-1]) and _CJK.match(text[0])) :
+            joined += " "
+        joined += text
+    return joined
+
+@dataclasses.dataclass
+class Recording :
+    """One recording kept in memory, from `stop_recording` to `transcribe`.
+
+    Attributes:
+        pcm (np.ndarray): Captured int16 samples, copied out of the ring buffer when recording stopped.
+        segments (list): Futures of the segments already sent to Whisper while recording.
+    """
+    pcm: np.ndarray
+    segments: list = dataclasses.field(default_factory = list)
+
+    @property
+    def seconds(self) -> float :
+        return self.pcm.size / AUDIO_RATE
+
+    def samples(self) -> np.ndarray :
+        """float32 samples in [-1, 1), the input Whisper expects."""
+        return self.pcm.astype(np.float32) / 32768.0
+
+class RingBuffer :
+    """Preallocated int16 ring buffer, written from the PortAudio callback thread.
+
+    Positions are absolute sample counts since the buffer was created, so a reader can keep its
+    offsets across wrap-arounds; only the last `capacity` samples can still be read.
+    """
+    def __init__(self, seconds: float) :
+        self.capacity = int(seconds * AUDIO_RATE)
+        self.data = np.zeros(self.capacity, dtype = np.int16)
+        self.total = 0
+        self.lock = threading.Lock()
+    
+    @property
+    def oldest(self) -> int :
+        return max(0, self.total - self.capacity)
+    
+    def write(self, pcm: np.ndarray) :
+        with self.lock :
+            size = pcm.size
+            pcm = pcm[-self.capacity:]
+            start = (self.total + size - pcm.size) % self.capacity
+            first = min(pcm.size, self.capacity - start)
+            self.data[start:start + first] = pcm[:first]
+            self.data[:pcm.size - first] = pcm[first:]
+            self.total += size
+    
+    def read(self, start: int, end: int | None = None) -> np.ndarray :
+        """Copy of the samples in [start, end), clamped to what is still in the buffer."""
+        with self.lock :
+            end = self.total if end is None else min(end, self.total)
+            start = max(start, self.total - self.capacity)
+            if start >= end :
+                return np.empty(0, dtype = np.int16)
+            offset = start % self.capacity
+            first = min(end - start, self.capacity - offset)
+            return np.concatenate((self.data[offset:offset + first], self.data[:end - start - first]))
+
 class AudioManager :
     def __init__(self) :
+        # Whisper 在背景執行緒載入 (見 load_model)，匯入本模組時不再阻塞程式啟動
+        self.model = None
+        self.model_lock = threading.Lock()
+        self.stream = None
+        self.p = None
+        self.is_recording = False
+        self.warm = False
+        # 錄音緩衝區只配置一次，callback 直接寫入，擷取過程中不再產生新的物件
+        self.ring = RingBuffer(config.AUDIO_MAX_RECORD_SECONDS)
+        self.audio_ready = threading.Event()
+        self.record_start = 0
+        self.record_end = None
+        # 串流辨識：錄音中切出的語音片段交給單一背景執行緒依序辨識，模型不會被同時呼叫
+        self.executor = ThreadPoolExecutor(max_workers = 1, thread_name_prefix = "whisper")
+        self._reset_vad()
+        if config.AUDIO_WARM_CAPTURE :
+            self.open_warm_stream()
+    
+    def load_model(self) -> bool :
+        """Load Whisper and run a short warm-up inference; does nothing once loaded.
+
+        Returns:
+            bool: Whether the model is ready.
+        """
+        with self.model_lock :
+            if self.model is not None :
+                return True
+            try :
+                start = time.perf_counter()
+                # whisper 會連帶載入 torch，延到背景載入時才匯入，不拖慢程式啟動
+                import whisper
+                model = whisper.load_model(config.WHISPER_MODEL)
+                # 先以一秒靜音推論一次，讓第一次真正的辨識不必再負擔初始化的成本
+                model.transcribe(np.zeros(AUDIO_RATE, dtype = np.float32), language = "zh", fp16 = False)
+                self.model = model
+                logger.info(f"Whisper model load success ({time.perf_counter() - start:.1f}s).")
+                return True
+            except Exception as e :
+                logger.error(f"Whisper model load failed: {e}")
+                return False
+    
+    def _transcribe_audio(self, audio: np.ndarray, prompt: str | None = None) -> str :
+        # 模型還在載入時會在這裡等待，因此載入完成前送出的錄音是排隊而不是被丟棄
+        if not self.load_model() :
+            raise RuntimeError("Whisper model is not available.")
+        return self.model.transcribe(audio, language = "zh", fp16 = False, initial_prompt = prompt or None)["text"].strip()
+    
+    def _open_stream(self) :
+        if self.p is None :
+            self.p = pyaudio.PyAudio()
+        self.stream = self.p.open(format = pyaudio.paInt16,
+                                  channels = 1,
+                                  rate = AUDIO_RATE,
+                                  input = True,
+                                  frames_per_buffer = AUDIO_CHUNK,
+                                  stream_callback = self._callback)
+    
+    def open_warm_stream(self) :
+        """Keep one input stream running so recording starts instantly with a pre-roll.
+
+        The callback only copies each chunk into the ring buffer while idle, and the last
+        `AUDIO_PREROLL_SECONDS` are prepended to the next recording so the first syllables are kept.
+        """
+        if self.stream is not None :
+            return
+        try :
+            self._open_stream()
+            self.warm = True
+            atexit.register(self.close)
+            logger.info("Warm audio capture started.")
+        except Exception as e :
+            logger.error(f"Start warm audio capture failed: {e}")
+            self.close()
+    
+    def close(self) :
+        """Release the input stream and PortAudio."""
+        self.is_recording = False
+        self.warm = False
         try :
-            self.model = whisper.load_model("base")
-            self.frames = []
+            if self.stream :
+                self.stream.stop_stream()
+                self.stream.close()
+            if self.p :
+                self.p.terminate()
+        except Exception as e :
+            logger.error(f"Close audio stream failed: {e}")
+        finally :
             self.stream = None
             self.p = None
-            self.is_recording = False
-            logger.info("Whisper model load success.")
-        except :
-            logger.error("Whisper model load failed.")
-            return False
     
     def start_recording(self) :
         if self.is_recording :
@@ -27,27 +182,97 @@ class AudioManager :
             return
         
         try :
-            self.p = pyaudio.PyAudio()
-            self.stream = self.p.open(format = pyaudio.paInt16,
-                                      channels = 1,
-                                      rate = 16000,
-                                      input = True,
-                                      frames_per_buffer = AUDIO_CHUNK)
+            self.audio_ready.clear()
+            self.record_end = None
+            if self.warm and self.stream is not None :
+                # 常駐串流已在擷取，直接從預錄緩衝區往前取一小段，不必重新初始化裝置
+                self.record_start = max(self.ring.total - int(config.AUDIO_PREROLL_SECONDS * AUDIO_RATE), self.ring.oldest)
+            else :
+                self.record_start = self.ring.total
+                self._open_stream()
+            self._reset_vad()
             self.is_recording = True
-            self.frames = []
         except Exception as e :
             logger.error(f"Start recording failed: {e}")
             self.is_recording = False
         
-    def process_stream(self) :
-        if self.is_recording and self.stream :
-            try :
-                data = self.stream.read(AUDIO_CHUNK, exception_on_overflow = False)
-                self.frames.append(data)
-            except :
-                pass
-        else :
+    def _callback(self, in_data, frame_count, time_info, status) :
+        # 在 PortAudio 的執行緒上執行，只把資料複製進緩衝區並通知等待中的 worker
+        self.ring.write(np.frombuffer(in_data, dtype = np.int16))
+        if self.is_recording :
+            self.audio_ready.set()
+        return None, pyaudio.paContinue
+    
+    def process_stream(self, timeout: float | None = 0.5) -> bool :
+        """Block until the callback delivers audio (or `interrupt` is called), then run VAD on it.
+
+        Returns:
+            bool: Whether recording is still going on.
+        """
+        if not (self.is_recording and self.stream) :
             logger.warning("Not recording.")
+            return False
+        self.audio_ready.wait(timeout)
+        self.audio_ready.clear()
+        if config.AUDIO_STREAMING_TRANSCRIBE :
+            self._process_new()
+        return self.is_recording
+    
+    def interrupt(self) :
+        """Wake up a `process_stream` call that is waiting for audio."""
+        self.audio_ready.set()
+    
+    def _reset_vad(self) :
+        self.segments = []
+        self.segment_start = self.record_start # ring position where the current segment begins
+        self.vad_position = self.record_start # ring position up to which VAD has run
+        self.segment_voiced = False
+        self.silent_chunks = 0
+    
+    def _process_new(self) :
+        """Run VAD over the whole chunks recorded since the last call."""
+        total = self.ring.total if self.record_end is None else self.record_end
+        end = self.vad_position + (total - self.vad_position) // AUDIO_CHUNK * AUDIO_CHUNK
+        pcm = self.ring.read(self.vad_position, end)
+        for offset in range(0, pcm.size - AUDIO_CHUNK + 1, AUDIO_CHUNK) :
+            self.vad_position += AUDIO_CHUNK
+            self._detect_segment(pcm[offset:offset + AUDIO_CHUNK])
+        self.vad_position = max(self.vad_position, end)
+    
+    def _detect_segment(self, pcm: np.ndarray) :
+        """Energy-based voice activity detection on the chunk just recorded.
+
+        A segment is cut once speech has been followed by `AUDIO_VAD_SILENCE_MS` of silence (and the
+        segment is long enough to transcribe well), or when it reaches `AUDIO_SEGMENT_MAX_SECONDS`.
+        """
+        samples = pcm.astype(np.float32)
+        voiced = samples.size > 0 and np.sqrt(np.mean(samples ** 2)) >= config.AUDIO_VAD_ENERGY
+        self.segment_voiced = self.segment_voiced or voiced
+        self.silent_chunks = 0 if voiced else self.silent_chunks + 1
+        
+        chunk_seconds = AUDIO_CHUNK / AUDIO_RATE
+        length = (self.vad_position - self.segment_start) / AUDIO_RATE
+        pause_ended = self.segment_voiced and self.silent_chunks * chunk_seconds * 1000 >= config.AUDIO_VAD_SILENCE_MS
+        if (pause_ended and length >= config.AUDIO_SEGMENT_MIN_SECONDS) or length >= config.AUDIO_SEGMENT_MAX_SECONDS :
+            if self.segment_voiced :
+                self._submit(self.ring.read(self.segment_start, self.vad_position))
+            self.segment_start = self.vad_position
+            self.segment_voiced = False
+            self.silent_chunks = 0
+    
+    def _submit(self, pcm: np.ndarray) :
+        audio = Recording(pcm).samples()
+        previous = self.segments[-1] if self.segments else None
+        self.segments.append(self.executor.submit(self._transcribe_segment, audio, previous))
+        logger.debug(f"Voice segment {len(self.segments)} queued ({audio.size / AUDIO_RATE:.1f}s).")
+    
+    def _transcribe_segment(self, audio: np.ndarray, previous = None) -> str :
+        # 以前一段的文字作為提示，讓跨片段的用詞保持一致
+        try :
+            prompt = previous.result() if previous is not None else None
+        except Exception :
+            prompt = None
+        return self._transcribe_audio(audio, prompt)
     
     def stop_recording(self) :
         if not self.is_recording :
@@ -57,44 +282,66 @@ class AudioManager :
         self.is_recording = False
         
         try :
-            if self.stream :
-                self.stream.stop_stream()
-                self.stream.close()
-            if self.p :
-                self.p.terminate()
+            if self.warm :
+                # 常駐模式不關閉串流，記下結束位置即可
+                self.record_end = self.ring.total
+            else :
+                self.close()
+                self.record_end = self.ring.total
+            
+            # 直接使用記憶體中的取樣，不再寫入暫存 WAV 檔再讀回
+            if self.record_start < self.ring.oldest :
+                logger.warning(f"Recording longer than {config.AUDIO_MAX_RECORD_SECONDS}s, keeping the last {config.AUDIO_MAX_RECORD_SECONDS}s.")
+            recording = Recording(self.ring.read(self.record_start, self.record_end))
+            if config.AUDIO_DEBUG_WAV :
+                self._write_wav(recording)
             
-            filepath = ROOT_DIR / f"{uuid.uuid4()}.wav"
-            wf = wave.open(str(filepath), "wb")
-            wf.setnchannels(1)
-            wf.setsampwidth(self.p.get_sample_size(pyaudio.paInt16))
-            wf.setframerate(16000)
-            wf.writeframes(b"".join(self.frames))
-            wf.close()
+            if self.segments :
+                # 錄音中已送出辨識的片段，停止時只剩最後一段需要處理
+                self._process_new()
+                if self.segment_voiced :
+                    self._submit(self.ring.read(self.segment_start, self.record_end))
+                recording.segments = self.segments
+                self.segments = []
             
-            return str(filepath)
+            return recording
         except Exception as e :
             logger.error(f"Stop recording failed: {e}")
             return None
     
-    def transcribe(self, filepath: str) -> str | None :
-        if not os.path.exists(filepath) :
-            logger.warning(f"File not found: {filepath}")
+    def _write_wav(self, recording: Recording) :
+        # 除錯用：保留錄音檔以便重聽，正常流程不會寫檔
+        filepath = config.LOG_DIR / f"recording-{datetime.datetime.now():%Y%m%d-%H%M%S}.wav"
+        try :
+            with wave.open(str(filepath), "wb") as wf :
+                wf.setnchannels(1)
+                wf.setsampwidth(recording.pcm.itemsize)
+                wf.setframerate(AUDIO_RATE)
+                wf.writeframes(recording.pcm.tobytes())
+            logger.info(f"Debug recording saved: {filepath}")
+        except Exception as e :
+            logger.error(f"Write debug recording failed: {e}")
+    
+    def transcribe(self, recording: Recording) -> str | None :
+        if recording is None or not recording.pcm.size :
+            logger.warning("Recording is empty.")
             return None
         
         try :
-            result = self.model.transcribe(filepath, language = "zh", fp16 = False)["text"].strip()
-            logger.info(f"Transcribe success: {result}")
+            result = None
+            if recording.segments :
+                try :
+                    result = _join_segments([segment.result() for segment in recording.segments])
+                    logger.info(f"Transcribe success ({len(recording.segments)} streamed segments): {result}")
+                except Exception as e :
+                    # 任一片段失敗時改為辨識完整錄音
+                    logger.warning(f"Streamed transcription failed, transcribing the whole recording: {e}")
+            if result is None :
+                result = self.executor.submit(self._transcribe_audio, recording.samples()).result()
+                logger.info(f"Transcribe success ({recording.seconds:.1f}s): {result}")
             return result
         except Exception as e :
             logger.error(f"Transcribe failed: {e}")
             return None
-        finally:
-            # 核心修正：無論轉錄成功或失敗，都嘗試刪除暫存的音訊檔。
-            try:
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-                    logger.info(f"Temporary audio file deleted: {filepath}")
-            except Exception as e:
-                logger.error(f"Failed to delete audio file {filepath}: {e}")
 
 audio_manager = AudioManager()
\ No newline at end of file
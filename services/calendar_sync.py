@@ -1,19 +1,39 @@
 import os
+import heapq
+import asyncio
+import itertools
 import datetime
+import threading
 import pytz
-from typing import Literal
+import httplib2
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Literal
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.errors import HttpError
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from config import config, ROOT_DIR
 from utils.logger import logger
+from data.event_store import event_store
+from utils.helper import event_start_key
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 TOKEN_PATH = ROOT_DIR / "token.json"
 CREDENTIALS_PATH = ROOT_DIR / "credentials.json"
 
+CALENDAR_KEYS = ("personal", "school", "task")
+# 只下載程式實際使用的欄位；status 與 eventType 供增量同步判斷刪除與事件種類
+EVENT_FIELDS = "nextPageToken,nextSyncToken,items(id,status,eventType,summary,start,end)"
+
+def _prime(iterator: Iterator[dict]) -> Iterator[dict] :
+    """Pull the first item of an iterator (doing its first request) and return an equivalent iterator."""
+    first = next(iterator, None)
+    if first is None:
+        return iter(())
+    return itertools.chain((first,), iterator)
+
 class CalendarService :
     def __init__(self):
         creds = None
@@ -38,6 +58,8 @@ class CalendarService :
                 with open(TOKEN_PATH, "w") as token:
                     token.write(creds.to_json())
 
+            self.creds = creds
+            self._local = threading.local()
             self.service = build("calendar", "v3", credentials=creds)
             logger.info("Google Calendar build success.")
         except Exception as e :
@@ -45,7 +67,7 @@ class CalendarService :
             # 核心修正：不要在 __init__ 中返回值。將 service 設為 None 來標記初始化失敗。
             self.service = None
     
-    def get_calendar_events(self, calendar_id: Literal["all", "personal", "school", "task"], start: str = datetime.datetime.now(pytz.timezone('Asia/Taipei')).replace(hour=0, minute=0, second=0).isoformat(timespec = "seconds"), end: str = (datetime.datetime.now(pytz.timezone('Asia/Taipei')) + datetime.timedelta(days=7)).replace(hour=23, minute=59, second=59).isoformat(timespec = "seconds")) -> list :
+    def get_calendar_events(self, calendar_id: Literal["all", "personal", "school", "task"], start: str | None = None, end: str | None = None) -> list :
         """Get specific time spec events.
 
         Args:
@@ -55,10 +77,43 @@ class CalendarService :
         Returns:
             list: return a single list of all events from the specified calendars.
         """
+        all_events = list(self.iter_calendar_events(calendar_id, start, end))
+        logger.info(f"--- DEBUG: Found a total of {len(all_events)} events. ---")
+        return all_events
+
+    async def get_calendar_events_async(self, calendar_id: Literal["all", "personal", "school", "task"], start: str | None = None, end: str | None = None) -> list :
+        """Awaitable `get_calendar_events`.
+
+        The Google API client is synchronous, so the requests run in a worker thread (each thread
+        has its own `AuthorizedHttp`) and the event loop stays free for other calls.
+        """
+        return await asyncio.to_thread(self.get_calendar_events, calendar_id, start, end)
+
+    def iter_calendar_events(self, calendar_id: Literal["all", "personal", "school", "task"], start: str | None = None, end: str | None = None) -> Iterator[dict] :
+        """Lazily yield the events of the specified calendars in start-time order.
+
+        Result pages are requested only when the previous one has been consumed, so long ranges on
+        busy calendars are never truncated and never held in memory all at once.
+
+        Args:
+            calendar_id (str): Choose which calendar to get events.
+            start (str, optional): Set the start time to get calendar events. Defaults to today.
+            end (str, optional): Set when to stop getting calendar events. Defaults to 7 days later.
+
+        Yields:
+            dict: Event with `id`, `summary`, `start`, `end` and the source calendar in `type`.
+        """
         # 核心修正：增加防衛敘述。如果服務未成功初始化，則直接返回，避免後續錯誤。
         if not self.service:
             logger.error("Calendar service is not available. Cannot fetch events.")
-            return []
+            return
+
+        # 預設值必須在呼叫時計算，寫在參數預設值會停留在模組載入的那一天
+        now = datetime.datetime.now(pytz.timezone('Asia/Taipei'))
+        if start is None:
+            start = now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat(timespec = "seconds")
+        if end is None:
+            end = (now + datetime.timedelta(days=7)).replace(hour=23, minute=59, second=59, microsecond=0).isoformat(timespec = "seconds")
 
         logger.info(f"--- DEBUG: Fetching calendar events with calendar_id='{calendar_id}', start='{start}', end='{end}' ---")
 
@@ -71,7 +126,6 @@ class CalendarService :
             logger.warning(f"End time '{end}' is missing timezone. Appending +08:00.")
             end += "+08:00"
 
-        all_events = []
         calendar_ids_to_fetch = (False, False, False) # (personal, school, task)
         match calendar_id:
             case "all":
@@ -83,41 +137,145 @@ class CalendarService :
             case "task":
                 calendar_ids_to_fetch = (False, False, True)
 
-        if calendar_ids_to_fetch[0]:
-            try:
-                personal_events = self.service.events().list(calendarId=config.PERSONAL_CALENDAR, timeMin=start, timeMax=end, singleEvents=True, orderBy="startTime", eventTypes=["default"]).execute().get("items", [])
-                for event in personal_events: event['type'] = 'personal'
-                all_events.extend(personal_events)
-                logger.info(f"Successfully fetched {len(personal_events)} events from 'personal' calendar.")
-            except HttpError as e:
-                logger.error(f"An HTTP error occurred when fetching 'personal' calendar: {e}")
-            except Exception as e:
-                logger.error(f"A general error occurred when fetching 'personal' calendar: {e}")
+        calendar_keys = [key for key, should_fetch in zip(CALENDAR_KEYS, calendar_ids_to_fetch) if should_fetch]
+        iterators = [self._iter_isolated(key, start, end) for key in calendar_keys]
+        if config.CALENDAR_CONCURRENT_FETCH and len(iterators) > 1:
+            # 各日曆的第一次請求 (同步或第一頁) 同時進行，整體延遲約等於最慢的那一個日曆
+            with ThreadPoolExecutor(max_workers=len(iterators), thread_name_prefix="calendar") as executor:
+                iterators = list(executor.map(_prime, iterators))
+
+        # 每個日曆的結果已依開始時間排序，合併後維持整體的時間順序
+        yield from heapq.merge(*iterators, key=event_start_key)
+
+    def _iter_isolated(self, calendar_key: str, start: str, end: str) -> Iterator[dict] :
+        """Yield one calendar's events, logging and swallowing its errors so the other calendars are unaffected."""
+        count = 0
+        try:
+            for event in self._iter_calendar(calendar_key, start, end):
+                event['type'] = calendar_key
+                count += 1
+                yield event
+            logger.info(f"Successfully fetched {count} events from '{calendar_key}' calendar.")
+        except HttpError as e:
+            logger.error(f"An HTTP error occurred when fetching '{calendar_key}' calendar: {e}")
+        except Exception as e:
+            logger.error(f"A general error occurred when fetching '{calendar_key}' calendar: {e}")
+
+    def _http(self) :
+        """Per-thread authorized HTTP object; httplib2 connections must not be shared between threads."""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            self._local.http = http
+        return http
+
+    def _iter_calendar(self, calendar_key: str, start: str, end: str) -> Iterator[dict] :
+        """Yield one calendar's events, from the local store when it covers the range.
+
+        Args:
+            calendar_key (str): "personal", "school" or "task".
+            start (str): RFC 3339 range start.
+            end (str): RFC 3339 range end.
 
-        if calendar_ids_to_fetch[1]:
+        Yields:
+            dict: Events ordered by start time.
+        """
+        start_dt = datetime.datetime.fromisoformat(start.replace("Z", "+00:00"))
+        end_dt = datetime.datetime.fromisoformat(end.replace("Z", "+00:00"))
+
+        if config.CALENDAR_SYNC_ENABLED and (event_store.covers(calendar_key, start_dt, end_dt) or event_store.get_time_min(calendar_key) is None):
             try:
-                school_events = self.service.events().list(calendarId=config.SCHOOL_CALENDAR, timeMin=start, timeMax=end, singleEvents=True, orderBy="startTime", eventTypes=["default"]).execute().get("items", [])
-                for event in school_events: event['type'] = 'school'
-                all_events.extend(school_events)
-                logger.info(f"Successfully fetched {len(school_events)} events from 'school' calendar.")
-            except HttpError as e:
-                logger.error(f"An HTTP error occurred when fetching 'school' calendar: {e}")
+                self.sync(calendar_key)
             except Exception as e:
-                logger.error(f"A general error occurred when fetching 'school' calendar: {e}")
+                # 同步失敗時仍使用本地既有資料；從未同步過的日曆則交給下面的直接查詢
+                logger.error(f"Incremental sync of '{calendar_key}' calendar failed: {e}")
+            if event_store.covers(calendar_key, start_dt, end_dt):
+                yield from event_store.query(calendar_key, start_dt, end_dt)
+                return
+
+        # 查詢範圍早於本地快取的起點 (或未啟用快取)，直接向 Google 逐頁查詢
+        for page in self._iter_pages(calendar_key, timeMin=start, timeMax=end, orderBy="startTime", eventTypes=["default"]):
+            yield from page.get("items", [])
+
+    def _iter_pages(self, calendar_key: str, **params) -> Iterator[dict] :
+        """Lazily follow the `nextPageToken` chain of an events().list() request.
+
+        Only the fields listed in `EVENT_FIELDS` are requested.
+
+        Yields:
+            dict: One raw response page at a time.
+        """
+        page_token = None
+        while True:
+            response = self.service.events().list(calendarId=self._resolve_calendar_id(calendar_key), singleEvents=True, fields=EVENT_FIELDS, pageToken=page_token, **params).execute(http=self._http())
+            yield response
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
+
+    def sync(self, calendar_key: str, force: bool = False) -> None :
+        """Bring the local event store of a calendar up to date.
 
-        if calendar_ids_to_fetch[2]:
+        The first call performs a full sync from `CALENDAR_SYNC_LOOKBACK_DAYS` ago to
+        `CALENDAR_SYNC_LOOKAHEAD_DAYS` ahead; later calls only download the changes since the stored
+        `syncToken`, until half of the look-ahead has passed and a new full sync moves the range forward.
+        Calls within `CALENDAR_SYNC_INTERVAL` seconds of the previous sync are skipped, so one command
+        never syncs the same calendar twice.
+
+        Args:
+            calendar_key (str): "personal", "school" or "task".
+            force (bool, optional): Ignore the sync interval. Defaults to False.
+        """
+        if not force and event_store.is_fresh(calendar_key, config.CALENDAR_SYNC_INTERVAL):
+            return
+
+        now = datetime.datetime.now(pytz.timezone('Asia/Taipei'))
+        sync_token = event_store.get_sync_token(calendar_key)
+        time_max = event_store.get_time_max(calendar_key)
+        if sync_token and (time_max is None or datetime.datetime.fromisoformat(time_max) - now < datetime.timedelta(days=config.CALENDAR_SYNC_LOOKAHEAD_DAYS / 2)):
+            # 同步範圍的終點快到了 (或是舊版沒有終點的快取)，改做一次完整同步把範圍往後移
+            logger.info(f"Sync range of '{calendar_key}' calendar needs to move forward, running a full sync.")
+            sync_token = None
+        if sync_token:
             try:
-                task_events = self.service.events().list(calendarId=config.TASK_CALENDAR, timeMin=start, timeMax=end, singleEvents=True, orderBy="startTime", eventTypes=["default"]).execute().get("items", [])
-                for event in task_events: event['type'] = 'task'
-                all_events.extend(task_events)
-                logger.info(f"Successfully fetched {len(task_events)} events from 'task' calendar.")
+                changes, next_token = self._list_all(calendar_key, syncToken=sync_token)
+                event_store.apply_changes(calendar_key, changes, next_token)
+                logger.info(f"Incremental sync of '{calendar_key}' calendar: {len(changes)} changes.")
+                return
             except HttpError as e:
-                logger.error(f"An HTTP error occurred when fetching 'task' calendar: {e}")
-            except Exception as e:
-                logger.error(f"A general error occurred when fetching 'task' calendar: {e}")
-        
-        logger.info(f"--- DEBUG: Found a total of {len(all_events)} events. ---")
-        return all_events
+                # 410 Gone：syncToken 已失效，必須清空後重新完整同步
+                if e.resp.status != 410:
+                    raise
+                logger.warning(f"Sync token of '{calendar_key}' calendar expired, running a full sync.")
+                event_store.clear(calendar_key)
+
+        time_min = (now - datetime.timedelta(days=config.CALENDAR_SYNC_LOOKBACK_DAYS)).replace(hour=0, minute=0, second=0, microsecond=0)
+        time_max = (now + datetime.timedelta(days=config.CALENDAR_SYNC_LOOKAHEAD_DAYS + 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        events, next_token = self._list_all(calendar_key, timeMin=time_min.isoformat(timespec = "seconds"), timeMax=time_max.isoformat(timespec = "seconds"))
+        event_store.replace(calendar_key, events, next_token, time_min.isoformat(timespec = "seconds"), time_max.isoformat(timespec = "seconds"))
+        logger.info(f"Full sync of '{calendar_key}' calendar: {len(events)} events.")
+
+    def _resolve_calendar_id(self, calendar_key: str) -> str | None :
+        match calendar_key:
+            case "personal":
+                return config.PERSONAL_CALENDAR
+            case "school":
+                return config.SCHOOL_CALENDAR
+            case "task":
+                return config.TASK_CALENDAR
+        return None
+
+    def _list_all(self, calendar_key: str, **params) -> tuple[list, str | None] :
+        """Follow every page of an events().list() sync request.
+
+        Returns:
+            tuple[list, str | None]: All items and the `nextSyncToken` of the last page.
+        """
+        items = []
+        response = {}
+        for response in self._iter_pages(calendar_key, **params):
+            items.extend(response.get("items", []))
+        return items, response.get("nextSyncToken")
     
     def add_event(self, calendar_id: Literal["personal", "school", "task"], event: dict) -> int :
         """Add events to assign calendar.
@@ -146,11 +304,17 @@ class CalendarService :
                 target_calendar_id = config.TASK_CALENDAR
         
         try :
-            self.service.events().insert(calendarId=target_calendar_id, body=event).execute()
+            created = self.service.events().insert(calendarId=target_calendar_id, body=event).execute(http=self._http())
+            # 立即寫入本地快取，下一次讀取不必等同步就能看到新事件
+            event_store.upsert(calendar_id, created)
             logger.info("Add event success.")
             return 200
         except Exception as e :
             logger.error(f"Add event failed: {e}")
             return 500
+
+    async def add_event_async(self, calendar_id: Literal["personal", "school", "task"], event: dict) -> int :
+        """Awaitable `add_event`, run in a worker thread."""
+        return await asyncio.to_thread(self.add_event, calendar_id, event)
         
 calendar_service = CalendarService()
\ No newline at end of file
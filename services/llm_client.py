@@ -1,26 +1,279 @@
+import re
+import copy
 import json
 import ast
 import os
-import datetime
+import time
+import hashlib
+import threading
+from pathlib import Path
+from collections import Counter, OrderedDict
 from dateutil.relativedelta import relativedelta
-import pytz
 import google.generativeai as genai
 from config import config
 from utils.logger import logger
-from utils.prompts import SCHEDULER_PROMPT, SLICE_TASK_PROMPT, USER_INTENT_PROMPT, STATE_CONTROLLER_PROMPT
-from services.calendar_sync import calendar_service
-from data.db_manager import db
+from utils.helper import atomic_write_text
+from utils.prompts import SCHEDULER_PROMPT, SLICE_TASK_PROMPT, USER_INTENT_PROMPT, STATE_CONTROLLER_PROMPT, TASK_NAME_RESOLVER_PROMPT, SYSTEM_PROMPTS
+from core.context import CommandContext
+from core.intervals import find_candidate_slots, shortlist
+from core.task_patch import apply_patch
+from data.behaviour_profile import behaviour_profile
+from data.similarity_index import similarity_index
+from services.model_router import ModelRouter
+from utils.json_stream import IncrementalJSONParser
+from utils.context_serializer import dump, fit, estimate_tokens, events_section, tasks_section, TASK_NAME_FIELDS
+
+def _normalize_text(text: str) -> str :
+    """Lower-case and strip whitespace/punctuation so near-identical commands share a cache key."""
+    return re.sub(r"[\s\W_]+", "", str(text)).casefold()
+
+class ResponseCache :
+    """Content-addressed cache of parsed LLM responses.
+
+    Entries are keyed by prompt type plus a SHA-256 of the normalised inputs and expire after the
+    prompt type's TTL (`config.LLM_CACHE_TTLS`). The memory tier is an LRU of `max_entries` items;
+    the optional disk tier in `DATA_DIR/llm_cache` survives restarts and is capped at `max_entries`
+    files as well, oldest first.
+    """
+    def __init__(self, max_entries: int, disk_dir: Path | None = None) :
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict() # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self._disk_files = 0
+        if self.disk_dir :
+            self.disk_dir.mkdir(parents = True, exist_ok = True)
+            self._prune_disk(sweep = True)
+        self.hits = Counter()
+        self.misses = Counter()
+
+    def ttl(self, prompt_type: str) -> int :
+        return config.LLM_CACHE_TTLS.get(prompt_type, 0)
+
+    def make_key(self, prompt_type: str, *parts, previous: bool = False) -> str | None :
+        """Hash the inputs of one call; the time bucket makes answers with relative times expire with the TTL.
+
+        With `previous`, the key of the preceding bucket, used to find a stale answer when the model is unavailable.
+        """
+        ttl = self.ttl(prompt_type)
+        if not config.LLM_CACHE_ENABLED or ttl <= 0 :
+            return None
+        bucket = int(time.time() // ttl) - int(previous)
+        payload = json.dumps([prompt_type, bucket, *parts], ensure_ascii = False, sort_keys = True, default = str)
+        return f"{prompt_type}-{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, prompt_type: str, key: str | None, allow_stale: bool = False) :
+        if key is None :
+            return None
+        now = 0 if allow_stale else time.time()
+        with self.lock :
+            entry = self._entries.get(key)
+            if entry and entry[0] > now :
+                self._entries.move_to_end(key)
+                self.hits[prompt_type] += 1
+                return copy.deepcopy(entry[1])
+            self._entries.pop(key, None)
+
+        entry = self._read_disk(key, allow_stale)
+        with self.lock :
+            if entry and entry[0] > now :
+                self._remember(key, entry)
+                self.hits[prompt_type] += 1
+                return copy.deepcopy(entry[1])
+            self.misses[prompt_type] += 1
+        return None
+
+    def put(self, prompt_type: str, key: str | None, value) :
+        if key is None or value is None :
+            return
+        entry = (time.time() + self.ttl(prompt_type), copy.deepcopy(value))
+        with self.lock :
+            self._remember(key, entry)
+        self._write_disk(key, entry)
+
+    def stats(self) -> dict :
+        with self.lock :
+            return {prompt_type: {"hits": self.hits[prompt_type], "misses": self.misses[prompt_type]}
+                    for prompt_type in set(self.hits) | set(self.misses)}
+
+    def _remember(self, key: str, entry: tuple) :
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries :
+            self._entries.popitem(last = False)
+
+    def _read_disk(self, key: str, allow_stale: bool = False) -> tuple | None :
+        if not self.disk_dir :
+            return None
+        filepath = self.disk_dir / f"{key}.json"
+        try :
+            with open(filepath, "r", encoding = "utf-8") as f :
+                data = json.load(f)
+        except (OSError, ValueError) :
+            return None
+        if data.get("expires_at", 0) <= time.time() and not allow_stale :
+            filepath.unlink(missing_ok = True)
+            return None
+        return data["expires_at"], data["value"]
+
+    def _write_disk(self, key: str, entry: tuple) :
+        if not self.disk_dir :
+            return
+        filepath = self.disk_dir / f"{key}.json"
+        try :
+            is_new = not filepath.exists()
+            atomic_write_text(filepath, json.dumps({"expires_at": entry[0], "value": entry[1]}, ensure_ascii = False))
+        except OSError as e :
+            logger.warning(f"Write LLM cache entry failed: {e}")
+            return
+        with self.lock :
+            self._disk_files += is_new
+            full = self._disk_files > self.max_entries
+        if full :
+            self._prune_disk()
+
+    def _prune_disk(self, sweep: bool = False) :
+        """Keep the `max_entries` newest files; with `sweep`, also delete files too old to be read again.
+
+        Keys contain the time bucket, so an expired file is only read once more, as the stale fallback
+        of the next bucket; after two TTLs nothing can look it up.
+        """
+        try :
+            files = sorted(((filepath.stat().st_mtime, filepath) for filepath in self.disk_dir.glob("*.json")), reverse = True)
+        except OSError as e :
+            logger.warning(f"List LLM cache failed: {e}")
+            return
+        now = time.time()
+        kept = removed = 0
+        for mtime, filepath in files :
+            prompt_type = filepath.stem.rsplit("-", 1)[0]
+            if kept >= self.max_entries or (sweep and mtime + 2 * self.ttl(prompt_type) < now) :
+                filepath.unlink(missing_ok = True)
+                removed += 1
+            else :
+                kept += 1
+        with self.lock :
+            self._disk_files = kept
+        if removed :
+            logger.info(f"LLM disk cache pruned: {removed} files removed, {kept} kept.")
+
 
 class LLMClient :
-    def __init__(self):
+    def __init__(self, model_factory = None):
         try :
             genai.configure(api_key = config.API_KEY)
-            self.model = genai.GenerativeModel("gemini-2.5-pro")
             logger.info("LLMClient initialized")
         except Exception as e :
             logger.critical(f"Error initializing LLMClient: {e}")
-            self.model = None
+        # 依提示類型選擇模型等級，並在超過延遲預算時改用更快的等級
+        self.router = ModelRouter(model_factory, SYSTEM_PROMPTS)
+        self.cache = ResponseCache(config.LLM_CACHE_MAX_ENTRIES, config.DATA_DIR / "llm_cache" if config.LLM_CACHE_DISK else None)
         
+    def _cached(self, prompt_type: str, key_parts: tuple) -> tuple[str | None, object] :
+        key = self.cache.make_key(prompt_type, *key_parts)
+        cached = self.cache.get(prompt_type, key)
+        if cached is not None :
+            logger.info(f"LLM cache hit for '{prompt_type}'. Stats: {self.cache.stats()}")
+        return key, cached
+
+    def _fallback(self, prompt_type: str, key_parts: tuple) :
+        """Last answer for the same inputs when no model tier answered in time, even if it has expired."""
+        stale = self.cache.get(prompt_type, self.cache.make_key(prompt_type, *key_parts, previous = True), allow_stale = True)
+        if stale is not None :
+            logger.warning(f"No model answered '{prompt_type}' within the latency budget, using a stale cached answer.")
+        else :
+            logger.error(f"No model answered '{prompt_type}' within the latency budget.")
+        return stale
+
+    def _members(self, result, path: tuple[str, ...]) -> dict :
+        members = result
+        for part in path :
+            members = members.get(part) if isinstance(members, dict) else None
+        return members if isinstance(members, dict) else {}
+
+    def _parse(self, prompt_type: str, key: str | None, key_parts: tuple, text: str | None) :
+        if text is None :
+            return self._fallback(prompt_type, key_parts)
+        result = self._clean_response(text)
+        self.cache.put(prompt_type, key, result)
+        return result
+
+    def _generate(self, prompt_type: str, prompt: str, key_parts: tuple = ()) :
+        """Generate and parse a JSON response, answering repeated inputs from the cache.
+
+        Args:
+            prompt_type (str): "intent", "schedule", "state", "resolve" or "slice"; selects the model tier, the latency budget and the TTL.
+            prompt (str): Full prompt.
+            key_parts (tuple): The normalised inputs that determine the answer.
+
+        Returns:
+            Parsed response, or None on failure.
+        """
+        key, cached = self._cached(prompt_type, key_parts)
+        if cached is not None :
+            return cached
+        logger.debug(f"'{prompt_type}' prompt: ~{estimate_tokens(prompt)} tokens.")
+        return self._parse(prompt_type, key, key_parts, self.router.generate(prompt_type, prompt))
+
+    async def _generate_async(self, prompt_type: str, prompt: str, key_parts: tuple = ()) :
+        """Awaitable `_generate`."""
+        key, cached = self._cached(prompt_type, key_parts)
+        if cached is not None :
+            return cached
+        logger.debug(f"'{prompt_type}' prompt: ~{estimate_tokens(prompt)} tokens.")
+        return self._parse(prompt_type, key, key_parts, await self.router.generate_async(prompt_type, prompt))
+
+    def _generate_stream(self, prompt_type: str, prompt: str, key_parts: tuple, path: tuple[str, ...], on_member) :
+        """Like `_generate`, but streams the response and reports each member of the object at `path` as soon as it closes.
+
+        Args:
+            prompt_type (str): Selects the model tier, the latency budget and the TTL.
+            prompt (str): Full prompt.
+            key_parts (tuple): The normalised inputs that determine the answer.
+            path (tuple[str, ...]): Keys leading to the object whose members are streamed.
+            on_member (Callable[[str, object], None]): Called with (key, value) for every completed member.
+
+        Returns:
+            The whole parsed response, or None on failure.
+        """
+        key, cached = self._cached(prompt_type, key_parts)
+        if cached is None :
+            parser, emitted = self._stream_parser(path, on_member)
+            text, _ = self.router.stream(prompt_type, prompt, parser)
+            cached = self._parse(prompt_type, key, key_parts, text)
+        else :
+            emitted = set()
+        self._replay(cached, path, on_member, emitted)
+        return cached
+
+    async def _generate_stream_async(self, prompt_type: str, prompt: str, key_parts: tuple, path: tuple[str, ...], on_member) :
+        """Awaitable `_generate_stream`; `on_member` runs on the event loop thread."""
+        key, cached = self._cached(prompt_type, key_parts)
+        if cached is None :
+            parser, emitted = self._stream_parser(path, on_member)
+            text, _ = await self.router.stream_async(prompt_type, prompt, parser)
+            cached = self._parse(prompt_type, key, key_parts, text)
+        else :
+            emitted = set()
+        self._replay(cached, path, on_member, emitted)
+        return cached
+
+    def _stream_parser(self, path: tuple[str, ...], on_member) :
+        """Text callback feeding an incremental parser, and the set of member keys it has reported."""
+        parser = IncrementalJSONParser(path)
+        emitted = set()
+        def on_text(text: str) :
+            for member_key, value in parser.feed(text) :
+                emitted.add(member_key)
+                on_member(member_key, value)
+        return on_text, emitted
+
+    def _replay(self, result, path: tuple[str, ...], on_member, emitted: set) :
+        """Report the members not streamed yet, e.g. from the cache or from a fallback tier that answered in one piece."""
+        for member_key, value in self._members(result, path).items() :
+            if member_key not in emitted :
+                on_member(member_key, value)
+
     def _clean_response(self, text: str) -> dict :
         """use to clean AI's response and turn into dict
 
@@ -40,38 +293,85 @@ class LLMClient :
             logger.error(f"Error cleaning response: {e}")
             return None
 
-    def sugget_schedule(self, command: dict) -> dict :
+    def sugget_schedule(self, command: dict, context: CommandContext | None = None, candidate_slots: list | None = None, draft: dict | None = None, on_recommendation = None) -> dict :
         """use AI to suggest user three recommand schedule
 
         Args:
             command (dict): Command has been AI format.
+            context (CommandContext, optional): Snapshot of the current command. Gathered when omitted.
+            candidate_slots (list, optional): Pre-computed `{"start", "end"}` slots. Computed here when omitted.
+            draft (dict, optional): Local scheduler recommendations for the model to refine.
+            on_recommendation (Callable[[str, dict], None], optional): With `config.LLM_STREAMING`, called with
+                (tier, recommendation) as soon as each recommendation has been generated.
         """
         if command is None:
             logger.warning("command is None.")
             return None
-        
-        now = datetime.datetime.now(pytz.timezone('Asia/Taipei')).isoformat(timespec = "seconds")
-
-        # 修正：確保 end 時間符合 RFC 3339 格式，避免 Google API 400 錯誤
-        due_date = command.get("due_date")
-        fetch_end = None
-        if due_date:
-            # 關鍵修正：只取 due_date 的日期部分 (前10個字元)，以建立一個格式正確的 RFC3339 時間字串。
-            # 這可以防止當 due_date 包含時間 (如 "2026-01-16 23:59:59") 時，產生格式錯誤的字串。
-            base_date_str = due_date[:10]
-            fetch_end = f"{base_date_str}T23:59:59+08:00"
-
-        calendar_events = calendar_service.get_calendar_events("all", end=fetch_end)
-        active_tasks_db = db.get_current_task() or []
-        historical_logs = db.get_history(3)
-        
+
+        request = self._schedule_request(command, context or CommandContext.gather(), candidate_slots, draft)
+        if isinstance(request, dict) :
+            return request
+        prompt, key_parts = request
+
+        if on_recommendation is not None and config.LLM_STREAMING :
+            result = self._generate_stream("schedule", prompt, key_parts, ("recommendations",), on_recommendation)
+        else :
+            result = self._generate("schedule", prompt, key_parts)
+        return self._schedule_result(result)
+
+    async def sugget_schedule_async(self, command: dict, context: CommandContext | None = None, candidate_slots: list | None = None, draft: dict | None = None, on_recommendation = None) -> dict :
+        """Awaitable `sugget_schedule`."""
+        if command is None:
+            logger.warning("command is None.")
+            return None
+
+        request = self._schedule_request(command, context or await CommandContext.gather_async(), candidate_slots, draft)
+        if isinstance(request, dict) :
+            return request
+        prompt, key_parts = request
+
+        if on_recommendation is not None and config.LLM_STREAMING :
+            result = await self._generate_stream_async("schedule", prompt, key_parts, ("recommendations",), on_recommendation)
+        else :
+            result = await self._generate_async("schedule", prompt, key_parts)
+        return self._schedule_result(result)
+
+    def _schedule_request(self, command: dict, context: CommandContext, candidate_slots: list | None, draft: dict | None) -> tuple[str, tuple] | dict :
+        """Build the scheduler prompt and its cache key, or return the fail result when no slot fits."""
+        now = context.now.isoformat(timespec = "seconds")
+
+        if candidate_slots is None:
+            # 修正：確保 end 時間符合 RFC 3339 格式，避免 Google API 400 錯誤
+            due_date = command.get("due_date")
+            fetch_end = None
+            if due_date:
+                # 關鍵修正：只取 due_date 的日期部分 (前10個字元)，以建立一個格式正確的 RFC3339 時間字串。
+                # 這可以防止當 due_date 包含時間 (如 "2026-01-16 23:59:59") 時，產生格式錯誤的字串。
+                base_date_str = due_date[:10]
+                fetch_end = f"{base_date_str}T23:59:59+08:00"
+
+            calendar_events = context.events_between(None, fetch_end)
+
+            # 在本地先算出所有符合硬性限制的空檔，模型只需要在精簡的候選清單中挑選
+            slots = find_candidate_slots(command, calendar_events, context.tasks(), context.now)
+            if not slots :
+                logger.info("No free slot satisfies the hard constraints.")
+                return {"status": "fail", "reason": "截止時間前找不到足夠長的空檔，請調整截止時間或預估時長。"}
+            candidate_slots = [{"start": start.isoformat(timespec = "seconds"), "end": end.isoformat(timespec = "seconds")}
+                               for start, end in shortlist(slots, config.SCHEDULER_MAX_CANDIDATES)]
+
+        # 只放入提示實際使用的欄位，並依各區段的 token 預算截斷；歷史紀錄以固定大小的行為摘要與最相似的幾筆任務取代
+        profile = behaviour_profile.summary()
+        similar = similarity_index.search(command.get("summary"))
         prompt = SCHEDULER_PROMPT.format(current_time = now,
-                                         command = command,
-                                         calendar_events = calendar_events,
-                                         active_tasks_db = active_tasks_db,
-                                         historical_logs = historical_logs)
-        result = self._clean_response(self.model.generate_content(prompt).text)
-        
+                                         command = dump(command),
+                                         candidate_slots = fit("candidates", candidate_slots),
+                                         local_draft = dump(draft) if draft else "null",
+                                         behaviour_profile = dump(profile),
+                                         similar_tasks = fit("similar_tasks", similar))
+        return prompt, (command, candidate_slots, draft, profile, similar)
+
+    def _schedule_result(self, result) :
         if result :
             logger.info(f"AI clean response: {result}")
             return result
@@ -79,40 +379,56 @@ class LLMClient :
             logger.error(f"Clean AI response failed or ai response wrong.")
             return None
     
-    def slice_task(self, command: dict) -> dict :
+    def slice_task(self, command: dict, context: CommandContext | None = None) -> dict :
         if command is None :
             logger.warning("Command is None.")
+            return None
         
-        historical_data = db.get_history()
+        # 只附上名稱最相近的歷史任務，而不是最近三個月的完整紀錄
+        similar = similarity_index.search(command.get("summary"))
         
-        prompt = SLICE_TASK_PROMPT.format(task_context = command, historical_data = historical_data)
-        result = self.model.generate_content(prompt)
+        prompt = SLICE_TASK_PROMPT.format(task_context = dump(command), historical_data = fit("similar_tasks", similar))
+        result = self._generate("slice", prompt, (command, similar))
         
         if result :
             return result
         else :
             return None
     
-    def analyze_intent(self, command: str) -> dict :
+    def analyze_intent(self, command: str, context: CommandContext | None = None) -> dict :
         """Analyze user's intent.
 
         Args:
             command (str): command from user
+            context (CommandContext, optional): Snapshot of the current command. Gathered when omitted.
 
         Returns:
             dict: AI's response in dict.
         """
-        current_time = datetime.datetime.now(pytz.timezone('Asia/Taipei')).isoformat(timespec = "seconds")
-        file = config.DATA_DIR / "current_task.json"
-        existing_tasks_db = db.get_current_task() or []
-        calendar_events = calendar_service.get_calendar_events('all')
+        prompt, key_parts = self._intent_request(command, context or CommandContext.gather())
+        return self._intent_result(self._generate("intent", prompt, key_parts))
+
+    async def analyze_intent_async(self, command: str, context: CommandContext | None = None) -> dict :
+        """Awaitable `analyze_intent`."""
+        prompt, key_parts = self._intent_request(command, context or await CommandContext.gather_async())
+        return self._intent_result(await self._generate_async("intent", prompt, key_parts))
+
+    def _intent_request(self, command: str, context: CommandContext) -> tuple[str, tuple] :
+        current_time = context.now.isoformat(timespec = "seconds")
+        existing_tasks_db = list(context.active_tasks)
+        calendar_events = list(context.calendar_events)
         
         prompt = USER_INTENT_PROMPT.format(current_time = current_time,
-                                           calendar_events = calendar_events,
-                                           existing_tasks_db = existing_tasks_db,
+                                           calendar_events = events_section(calendar_events),
+                                           existing_tasks_db = tasks_section(existing_tasks_db, TASK_NAME_FIELDS),
                                            command = command)
-        result = self._clean_response(self.model.generate_content(prompt).text)
-        
+        # 只有會影響答案的部分進入快取鍵：指令文字、任務名稱與狀態、日曆事件名稱
+        key_parts = (_normalize_text(command),
+                     sorted((t.get("summary", ""), t.get("status", "")) for t in existing_tasks_db),
+                     sorted(e.get("summary", "") for e in calendar_events))
+        return prompt, key_parts
+
+    def _intent_result(self, result) :
         if result :
             logger.info(f"AI clean response: {result}")
             return result
@@ -120,11 +436,15 @@ class LLMClient :
             logger.error("Clean AI response failed or ai response wrong.")
             return None
     
-    def change_status(self, incoming_action: dict) -> list | None :
+    def change_status(self, incoming_action: dict, context: CommandContext | None = None) -> list | None :
         """Change doing task's status
 
+        The model returns a `{op, task_id, changes}` patch for the target task only;
+        it is validated and applied locally to the active tasks.
+
         Args:
             incoming_action (dict): Intent response dict.
+            context (CommandContext, optional): Snapshot of the current command. Gathered when omitted.
 
         Returns:
             list | None: The updated list of tasks, or None on failure.
@@ -133,22 +453,60 @@ class LLMClient :
             logger.warning("command is None.")
             return None
 
-        current_time = datetime.datetime.now(pytz.timezone('Asia/Taipei')).isoformat()
-        current_active_tasks_json = db.get_current_task() or []
+        prompt, tasks = self._state_request(incoming_action, context or CommandContext.gather())
+        return self._state_result(self._generate("state", prompt), tasks)
+
+    async def change_status_async(self, incoming_action: dict, context: CommandContext | None = None) -> list | None :
+        """Awaitable `change_status`."""
+        if incoming_action is None :
+            logger.warning("command is None.")
+            return None
+
+        prompt, tasks = self._state_request(incoming_action, context or await CommandContext.gather_async())
+        return self._state_result(await self._generate_async("state", prompt), tasks)
+
+    def _state_request(self, incoming_action: dict, context: CommandContext) -> tuple[str, list] :
+        current_time = context.now.isoformat()
+        current_active_tasks_json = context.tasks()
         
-        calendar_tasks = calendar_service.get_calendar_events("task")
+        calendar_tasks = context.events("task")
         
         prompt = STATE_CONTROLLER_PROMPT.format(current_time=current_time,
-                                                 current_active_tasks_json = current_active_tasks_json,
-                                                 calendar_tasks = calendar_tasks,
-                                                 incoming_action = incoming_action)
-        result = self._clean_response(self.model.generate_content(prompt).text)
-        
-        if result :
-            logger.info(f"AI has processed the state change. New state: {result}")
-            return result
+                                                 # 狀態控制器必須看到所有任務，否則找不到目標任務時可能回傳 create 而重複建立
+                                                 current_active_tasks_json = tasks_section(current_active_tasks_json, truncate = False),
+                                                 calendar_tasks = events_section(calendar_tasks, "calendar_tasks"),
+                                                 incoming_action = dump(incoming_action))
+        return prompt, current_active_tasks_json
+
+    def _state_result(self, patch, tasks: list) -> list | None :
+        if patch :
+            # AI 只回傳單一任務的變更，由本地驗證後套用，回應大小不受任務數量影響
+            logger.info(f"AI has processed the state change. Patch: {patch}")
+            return apply_patch(tasks, patch)
         else :
             logger.error("AI failed to process the state change.")
             return None
 
+    def resolve_task_name(self, spoken_name: str, candidates: list[str]) -> str | None :
+        """Ask the model which of several similarly named tasks the user meant.
+
+        Args:
+            spoken_name (str): Task name from the intent.
+            candidates (list[str]): Active task names that match it equally well.
+
+        Returns:
+            str | None: One of `candidates`, or None if the model cannot decide.
+        """
+        prompt = TASK_NAME_RESOLVER_PROMPT.format(spoken_name = spoken_name,
+                                                  candidates = dump(candidates))
+        result = self._generate("resolve", prompt, (_normalize_text(spoken_name), sorted(candidates)))
+        name = result.get("summary") if isinstance(result, dict) else None
+        
+        if name in candidates :
+            logger.info(f"AI resolved task name '{spoken_name}' to '{name}'.")
+            return name
+        else :
+            logger.warning(f"AI could not resolve task name '{spoken_name}' among {candidates}.")
+            return None
+
 llm_client = LLMClient()
\ No newline at end of file
@@ -0,0 +1,221 @@
+import json
+import time
+import asyncio
+import threading
+from pathlib import Path
+import google.generativeai as genai
+from config import config
+from utils.logger import logger
+from utils.helper import atomic_write_text
+
+EMA_WEIGHT = 0.2 # 新樣本在平均延遲中的權重
+MIN_PRIMARY_SHARE = 0.5 # 主要等級至少可以使用剩餘預算的比例
+MIN_FALLBACK_SHARE = 0.2 # 至少保留給下一個等級的剩餘預算比例
+
+def _error_text(error: Exception) -> str :
+    return f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+
+def _chunk_text(chunk) -> str :
+    try :
+        return chunk.text
+    except ValueError as e :
+        # 被安全過濾擋下的片段沒有 text，略過即可
+        logger.warning(f"Skip streamed chunk without text: {e}")
+        return ""
+
+class LatencyStats :
+    """Per tier and prompt type latency of Gemini calls, persisted so the routing table can be tuned.
+
+    Layout of the stats file:
+        {tier: {prompt_type: {"count": int, "errors": int, "ema": float, "max": float, "last": float}}}
+    """
+    def __init__(self, filepath: Path | None = None) :
+        self.filepath = filepath or config.DATA_DIR / "llm_latency.json"
+        self.lock = threading.Lock()
+        self._data = self._load()
+
+    def _load(self) -> dict :
+        if not self.filepath.exists() :
+            return {}
+        try :
+            with open(self.filepath, "r", encoding = "utf-8") as f :
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e :
+            logger.error(f"Read latency stats failed, starting from empty stats: {e}")
+            return {}
+
+    def _save(self) :
+        try :
+            atomic_write_text(self.filepath, json.dumps(self._data, indent = 4))
+        except Exception as e :
+            logger.error(f"Write latency stats failed: {e}")
+
+    def record(self, tier: str, prompt_type: str, seconds: float, ok: bool) :
+        with self.lock :
+            entry = self._data.setdefault(tier, {}).setdefault(prompt_type, {"count": 0, "errors": 0, "ema": None, "max": 0.0, "last": None})
+            entry["count"] += 1
+            entry["last"] = round(seconds, 3)
+            if ok :
+                entry["ema"] = round(seconds if entry["ema"] is None else (1 - EMA_WEIGHT) * entry["ema"] + EMA_WEIGHT * seconds, 3)
+                entry["max"] = round(max(entry["max"], seconds), 3)
+            else :
+                entry["errors"] += 1
+            self._save()
+
+    def expected(self, tier: str) -> float | None :
+        """Typical successful latency of a tier over all prompt types, or None without data."""
+        with self.lock :
+            samples = [e for e in self._data.get(tier, {}).values() if e.get("ema") is not None]
+            if not samples :
+                return None
+            return sum(e["ema"] * e["count"] for e in samples) / sum(e["count"] for e in samples)
+
+    def summary(self) -> dict :
+        with self.lock :
+            return json.loads(json.dumps(self._data))
+
+class ModelRouter :
+    """Sends each prompt type to its configured model tier within a latency budget.
+
+    `config.MODEL_ROUTES` maps a prompt type to a tier of `config.MODEL_TIERS`; when that tier
+    fails or exceeds its share of `config.LLM_LATENCY_BUDGETS`, the next faster tier is tried
+    with the time left. Part of the budget is reserved for the fallback, sized from its
+    recorded latency. Returns None when every tier failed so the caller can use a cached or
+    local answer.
+    """
+    def __init__(self, model_factory = None, system_instructions: dict | None = None, stats: LatencyStats | None = None) :
+        """
+        Args:
+            model_factory (Callable, optional): Called as `model_factory(model_name, system_instruction=...)`;
+                defaults to `genai.GenerativeModel`. A fake can be injected to run without the API.
+            system_instructions (dict, optional): Static instructions per prompt type.
+            stats (LatencyStats, optional): Where latencies are recorded.
+        """
+        self.model_factory = model_factory or genai.GenerativeModel
+        self.system_instructions = system_instructions or {}
+        self.stats = stats or LatencyStats()
+        self._models = {}
+        self.lock = threading.Lock()
+
+    def model(self, tier: str, prompt_type: str) :
+        """The model of a tier for one prompt type, created once with that type's system instruction.
+
+        Requests then only carry the dynamic data, and the identical instruction prefix of every
+        request is eligible for Gemini's implicit context caching.
+        """
+        with self.lock :
+            if (tier, prompt_type) not in self._models :
+                self._models[(tier, prompt_type)] = self.model_factory(config.MODEL_TIERS[tier],
+                                                                       system_instruction = self.system_instructions.get(prompt_type))
+            return self._models[(tier, prompt_type)]
+
+    def tiers_for(self, prompt_type: str) -> list[str] :
+        """The routed tier followed by every faster tier."""
+        tiers = list(config.MODEL_TIERS)
+        routed = config.MODEL_ROUTES.get(prompt_type, tiers[-1])
+        if routed not in tiers :
+            logger.warning(f"Unknown model tier '{routed}' for '{prompt_type}', using '{tiers[-1]}'.")
+            routed = tiers[-1]
+        return tiers[:tiers.index(routed) + 1][::-1]
+
+    def _timeout(self, tiers: list, index: int, remaining: float) -> float :
+        if index + 1 >= len(tiers) :
+            return remaining
+        expected = self.stats.expected(tiers[index + 1])
+        reserve = remaining * (1 - MIN_PRIMARY_SHARE) if expected is None else max(expected, remaining * MIN_FALLBACK_SHARE)
+        return max(remaining - reserve, remaining * MIN_PRIMARY_SHARE)
+
+    def _attempts(self, prompt_type: str) :
+        """Yield (tier, timeout) for each attempt until the budget is used up."""
+        deadline = time.monotonic() + config.LLM_LATENCY_BUDGETS.get(prompt_type, 30)
+        tiers = self.tiers_for(prompt_type)
+        for index, tier in enumerate(tiers) :
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 :
+                logger.warning(f"Latency budget for '{prompt_type}' used up before trying '{tier}'.")
+                return
+            yield tier, self._timeout(tiers, index, remaining)
+
+    def finish(self, tier: str, prompt_type: str, started: float, error: Exception | None = None) :
+        """Record one attempt that began at `started` (`time.monotonic()`)."""
+        elapsed = time.monotonic() - started
+        self.stats.record(tier, prompt_type, elapsed, error is None)
+        if error is None :
+            logger.info(f"'{prompt_type}' answered by {tier} tier in {elapsed:.2f}s.")
+        else :
+            logger.warning(f"'{prompt_type}' on {tier} tier failed after {elapsed:.2f}s: {_error_text(error)}")
+
+    def _request(self, tier: str, prompt_type: str, prompt: str, timeout: float, on_text = None) -> str :
+        model = self.model(tier, prompt_type)
+        if on_text is None :
+            return model.generate_content(prompt, request_options = {"timeout": timeout}).text
+        # request_options 只限制單一次請求，整段串流的時間在每個片段之間檢查
+        deadline = time.monotonic() + timeout
+        chunks = []
+        for chunk in model.generate_content(prompt, stream = True, request_options = {"timeout": timeout}) :
+            text = _chunk_text(chunk)
+            chunks.append(text)
+            on_text(text)
+            if time.monotonic() > deadline :
+                raise TimeoutError(f"stream still running after {timeout:.1f}s")
+        return "".join(chunks)
+
+    async def _request_async(self, tier: str, prompt_type: str, prompt: str, timeout: float, on_text = None) -> str :
+        model = self.model(tier, prompt_type)
+        async def request() :
+            if on_text is None :
+                return (await model.generate_content_async(prompt, request_options = {"timeout": timeout})).text
+            chunks = []
+            async for chunk in await model.generate_content_async(prompt, stream = True, request_options = {"timeout": timeout}) :
+                text = _chunk_text(chunk)
+                chunks.append(text)
+                on_text(text)
+            return "".join(chunks)
+        # request_options 只限制單一次請求，整段串流的時間由 wait_for 控制
+        return await asyncio.wait_for(request(), timeout)
+
+    def stream(self, prompt_type: str, prompt: str, on_text = None) -> tuple[str | None, bool] :
+        """Generate a response text, falling back to faster tiers.
+
+        Args:
+            prompt_type (str): Selects the route and the latency budget.
+            prompt (str): Full prompt.
+            on_text (Callable[[str], None], optional): When given, the routed tier streams its response
+                through it; fallback tiers answer in one piece.
+
+        Returns:
+            tuple[str | None, bool]: The response text (None when every attempt failed or timed out),
+            and whether it was the streamed one.
+        """
+        for index, (tier, timeout) in enumerate(self._attempts(prompt_type)) :
+            started = time.monotonic()
+            try :
+                text = self._request(tier, prompt_type, prompt, timeout, on_text if index == 0 else None)
+            except Exception as e :
+                self.finish(tier, prompt_type, started, e)
+                continue
+            self.finish(tier, prompt_type, started)
+            return text, index == 0 and on_text is not None
+        return None, False
+
+    async def stream_async(self, prompt_type: str, prompt: str, on_text = None) -> tuple[str | None, bool] :
+        """Awaitable `stream`."""
+        for index, (tier, timeout) in enumerate(self._attempts(prompt_type)) :
+            started = time.monotonic()
+            try :
+                text = await self._request_async(tier, prompt_type, prompt, timeout, on_text if index == 0 else None)
+            except Exception as e :
+                self.finish(tier, prompt_type, started, e)
+                continue
+            self.finish(tier, prompt_type, started)
+            return text, index == 0 and on_text is not None
+        return None, False
+
+    def generate(self, prompt_type: str, prompt: str) -> str | None :
+        """Response text from the first tier that answers within the budget, or None."""
+        return self.stream(prompt_type, prompt)[0]
+
+    async def generate_async(self, prompt_type: str, prompt: str) -> str | None :
+        """Awaitable `generate`."""
+        return (await self.stream_async(prompt_type, prompt))[0]
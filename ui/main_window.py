@@ -5,12 +5,13 @@ from ui.views.task_view import TaskView
 from ui.views.calendar_view import CalendarView
 from PyQt6.QtWidgets import QMainWindow, QApplication, QFrame
 from PyQt6.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, pyqtSignal # 記得引入 pyqtSignal
-from ui.workers import RecorderWorker, AIProcessorWorker
+from ui.workers import RecorderWorker, AIProcessorWorker, ModelLoaderWorker
 import keyboard
 from core.state_machine import task_state_manager
 from config import config
 from services.calendar_sync import calendar_service
 from data.db_manager import db
+from utils.logger import logger
 
 class MainWindow(QMainWindow):
     sig_hotkey_voice = pyqtSignal()
@@ -65,9 +66,15 @@ class MainWindow(QMainWindow):
         
         self.recorder = RecorderWorker()
         self.ai_processer = AIProcessorWorker()
+        self.model_loader = ModelLoaderWorker()
+        # Whisper 尚未載入完成 (或上一筆還在處理) 時錄好的音訊先排隊，不直接丟棄
+        self.pending_audio = []
+        self.model_checked = False
         
         # Connect worker signals
         self.recorder.recorded.connect(self.process_audio)
+        self.model_loader.ready.connect(self.on_model_ready)
+        self.ai_processer.finished.connect(self.on_ai_finished)
         # 核心修正：斷開這個錯誤的連接。不應該在所有 AI 指令處理完成後都顯示日曆。
         # self.ai_processer.finished.connect(self.show_calendar_view)
 
@@ -88,6 +95,9 @@ class MainWindow(QMainWindow):
         keyboard.add_hotkey("Alt+A", lambda: self.sig_hotkey_task.emit())
         
         self.move_to_corner()
+        
+        # 等事件迴圈開始、視窗顯示之後才在背景載入語音模型
+        QTimer.singleShot(0, self.model_loader.start)
 
     def move_to_corner(self):
         self.move(self.screen.width() - self.width() - 20, self.screen.height() - self.height() - 20)
@@ -185,13 +195,34 @@ class MainWindow(QMainWindow):
         
         self.move_to_corner()
 
-    def process_audio(self, audio_path):
-        """Process the recorded audio file."""
-        print(f"Processing audio at: {audio_path}")
-        self.ai_processer.set_var("audio", audio_path)
-        self.ai_processer.start()
+    def process_audio(self, recording):
+        """Process the recorded audio, or queue it until the model and the AI processor are free."""
+        self.pending_audio.append(recording)
+        if not self.model_checked:
+            logger.info(f"Whisper model is still loading, {len(self.pending_audio)} recording(s) queued.")
+        self.process_pending_audio()
         self.hide()
 
+    def process_pending_audio(self):
+        if not self.pending_audio or not self.model_checked or self.ai_processer.isRunning():
+            return
+        recording = self.pending_audio.pop(0)
+        print(f"Processing audio: {recording.seconds:.1f}s")
+        self.ai_processer.set_var("audio", recording)
+        self.ai_processer.start()
+
+    def on_model_ready(self, ok):
+        self.model_checked = True
+        if not ok:
+            # 載入失敗時，排隊中的錄音仍交給處理器，由 transcribe 重新嘗試載入
+            task_state_manager.error_info.emit("語音模型載入失敗，將在下次辨識時重試。")
+        self.process_pending_audio()
+
+    def on_ai_finished(self):
+        # finished 在 run() 結束前就發出，先等執行緒真正結束才能再次 start
+        self.ai_processer.wait()
+        self.process_pending_audio()
+
     def show_calendar_view(self):
         """顯示日曆視圖，並根據內容動態調整大小。"""
         # 日曆視圖需要使用者選擇，屬於互動模式
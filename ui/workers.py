@@ -7,7 +7,7 @@ from utils.logger import logger
 from typing import Literal
 
 class RecorderWorker(QThread) :
-    recorded = pyqtSignal(str) # return file path
+    recorded = pyqtSignal(object) # return Recording
     
     def __init__(self):
         super().__init__()
@@ -17,48 +17,56 @@ class RecorderWorker(QThread) :
         self.is_recording = True
         audio_manager.start_recording()
         
-        while self.is_recording :
-            audio_manager.process_stream()
+        # 等待 callback 寫入新的音訊才醒來，不再忙碌輪詢
+        while self.is_recording and audio_manager.process_stream() :
+            pass
     
     def stop(self) :
         self.is_recording = False
+        audio_manager.interrupt()
         self.wait()
         
-        file_path = audio_manager.stop_recording()
-        if file_path :
-            self.recorded.emit(file_path)
-            logger.info(f"Record complete. File path: {file_path}")
+        recording = audio_manager.stop_recording()
+        if recording is not None :
+            self.recorded.emit(recording)
+            logger.info(f"Record complete. Length: {recording.seconds:.1f}s")
         else :
             logger.warning("Record failed.")
 
+class ModelLoaderWorker(QThread) :
+    ready = pyqtSignal(bool) # whether the Whisper model loaded
+    
+    def run(self) :
+        self.ready.emit(audio_manager.load_model())
+
 class AIProcessorWorker(QThread) :
     finished = pyqtSignal() # complete signal
     
     def __init__(self) :
         super().__init__()
-        self.audio_path = None
+        self.audio = None
         self.text = None
     
-    def set_var(self, var_type: Literal["audio", "text"], var: str) :
+    def set_var(self, var_type: Literal["audio", "text"], var) :
         if var_type == "audio" :
-            self.audio_path = var
+            self.audio = var
         elif var_type == "text" :
             self.text = var
     
     def run(self) :
         try:
             logger.debug("start AI processor.")
-            if self.audio_path:
-                self.text = audio_manager.transcribe(self.audio_path)
+            if self.audio is not None:
+                self.text = audio_manager.transcribe(self.audio)
             
             if self.text:
                 task_state_manager.process_voice(self.text)
             else:
-                # Only emit error if we started with an audio path and transcription failed.
-                if self.audio_path:
+                # Only emit error if we started with a recording and transcription failed.
+                if self.audio is not None:
                     task_state_manager.error_info.emit("Please repeat again.")
         finally:
             # Ensure state is reset and finished signal is emitted
-            self.audio_path = None
+            self.audio = None
             self.text = None
             self.finished.emit()
\ No newline at end of file
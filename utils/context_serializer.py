@@ -0,0 +1,88 @@
+import json
+import re
+from config import config
+from utils.logger import logger
+from utils.helper import event_start_key
+
+# 提示中實際會用到的欄位
+TASK_FIELDS = ("task_id", "summary", "status", "start", "pause_reason", "_internal_pause_start_time", "_internal_total_paused_seconds")
+TASK_NAME_FIELDS = ("summary", "status")
+HISTORY_FIELDS = ("summary", "start", "end", "status", "duration", "planned_minutes")
+LOG_FIELDS = ("event", "time", "reason")
+CJK_PATTERN = re.compile(r"[⺀-鿿가-힯＀-￯]")
+
+def dump(value) -> str :
+    """Compact JSON: no spaces, non-ASCII kept as is."""
+    return json.dumps(value, ensure_ascii = False, separators = (",", ":"), default = str)
+
+def estimate_tokens(text: str) -> int :
+    """Rough Gemini token count: about one token per CJK character and per four other characters."""
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _time_value(value) -> str | None :
+    """Flatten a Google `{"dateTime"|"date"}` object to its string."""
+    if isinstance(value, dict) :
+        return value.get("dateTime") or value.get("date")
+    return value
+
+def _pick(source: dict, fields: tuple) -> dict :
+    return {field: source[field] for field in fields if source.get(field) is not None}
+
+def project_event(event: dict) -> dict :
+    """Keep the id, name, calendar and flattened start/end of a calendar event."""
+    projected = {"id": event.get("id"),
+                 "summary": event.get("summary"),
+                 "type": event.get("type"),
+                 "start": _time_value(event.get("start")),
+                 "end": _time_value(event.get("end"))}
+    return {key: value for key, value in projected.items() if value is not None}
+
+def project_history(task: dict) -> dict :
+    """Keep the fields and log entries the scheduler and slicer reason about."""
+    projected = _pick(task, HISTORY_FIELDS)
+    projected.setdefault("summary", task.get("task_name"))
+    logs = [_pick(log, LOG_FIELDS) for log in task.get("logs") or [] if log.get("event") in ("PAUSE", "RESUME")]
+    if logs :
+        projected["logs"] = logs
+    return projected
+
+def fit(name: str, items: list, budget: int | None = None) -> str :
+    """Serialize `items` (already in priority order) as a compact JSON array within a token budget.
+
+    Items are kept in order while they fit; the rest are dropped and replaced by one
+    `{"omitted": n}` marker so the model knows the list is incomplete.
+
+    Args:
+        name (str): Section name, a key of `config.PROMPT_TOKEN_BUDGETS`.
+        items (list): Projected items, most important first.
+        budget (int, optional): Token budget. Defaults to the configured one.
+
+    Returns:
+        str: The serialized section.
+    """
+    budget = budget if budget is not None else config.PROMPT_TOKEN_BUDGETS.get(name, 1000)
+    kept = []
+    used = 2 # []
+    for item in items :
+        text = dump(item)
+        cost = estimate_tokens(text) + 1
+        if used + cost > budget :
+            break
+        kept.append(text)
+        used += cost
+
+    omitted = len(items) - len(kept)
+    if omitted :
+        kept.append(dump({"omitted": omitted}))
+        logger.info(f"Prompt section '{name}' truncated to {len(kept) - 1}/{len(items)} items (~{used} tokens).")
+    return "[" + ",".join(kept) + "]"
+
+def events_section(events: list, name: str = "events") -> str :
+    """Events ordered by start time, so the nearest ones survive truncation."""
+    return fit(name, [project_event(e) for e in sorted(events, key = event_start_key)])
+
+def tasks_section(tasks: list, fields: tuple = TASK_FIELDS, truncate: bool = True) -> str :
+    """Active tasks, in-progress ones first; with `truncate=False` every task is kept regardless of the budget."""
+    ordered = sorted(tasks, key = lambda t : t.get("status") != "IN_PROGRESS")
+    return fit("tasks", [_pick(t, fields) for t in ordered], None if truncate else float("inf"))
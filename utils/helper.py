@@ -0,0 +1,153 @@
+import os
+import re
+import difflib
+import datetime
+from pathlib import Path
+import pytz
+from dateutil.parser import parse
+
+TAIPEI_TZ = pytz.timezone('Asia/Taipei')
+
+def atomic_write_bytes(filepath: Path, data: bytes, fsync: bool = False) :
+    """Replace `filepath` with `data` through a temporary file, so a crash mid-write never leaves a truncated file.
+
+    Args:
+        filepath (Path): Destination file.
+        data (bytes): Full new content.
+        fsync (bool, optional): Flush the temporary file to disk before the rename. Defaults to False.
+
+    Raises:
+        OSError: If the write or the rename fails; the destination is left untouched.
+    """
+    tmp_path = filepath.with_suffix(".tmp")
+    try :
+        with open(tmp_path, "wb") as f :
+            f.write(data)
+            if fsync :
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException :
+        tmp_path.unlink(missing_ok = True)
+        raise
+
+def atomic_write_text(filepath: Path, text: str, fsync: bool = False) :
+    """`atomic_write_bytes` for UTF-8 text."""
+    atomic_write_bytes(filepath, text.encode("utf-8"), fsync)
+
+def parse_event_time(value: dict | str | None) -> datetime.datetime | None :
+    """Parse a Google Calendar time object into an aware datetime.
+
+    Args:
+        value (dict | str | None): `{"dateTime": ...}`, `{"date": ...}` or a raw ISO 8601 string.
+
+    Returns:
+        datetime.datetime | None: Aware datetime (all-day events start at 00:00 Asia/Taipei), or None if unparsable.
+    """
+    if not value :
+        return None
+    if isinstance(value, dict) :
+        raw = value.get("dateTime") or value.get("date")
+    else :
+        raw = value
+    if not raw or not isinstance(raw, str) :
+        return None
+
+    try :
+        dt = parse(raw)
+    except (ValueError, TypeError, OverflowError) :
+        return None
+
+    if dt.tzinfo is None :
+        dt = TAIPEI_TZ.localize(dt)
+    return dt
+
+def event_bounds(event: dict) -> tuple[datetime.datetime, datetime.datetime] | None :
+    """Return the (start, end) of a calendar event or task as aware datetimes.
+
+    Args:
+        event (dict): Google event (`start`/`end`) or local task (`start_time`/`due_date`).
+
+    Returns:
+        tuple | None: (start, end), or None if the start cannot be parsed.
+    """
+    start = parse_event_time(event.get("start") or event.get("start_time"))
+    if start is None :
+        return None
+    end = parse_event_time(event.get("end") or event.get("due_date"))
+    if end is None or end < start :
+        end = start
+    return start, end
+
+def event_start_key(event: dict) -> datetime.datetime :
+    """Sort key ordering events by start time; unparsable events sort last."""
+    bounds = event_bounds(event)
+    return bounds[0] if bounds else datetime.datetime.max.replace(tzinfo = pytz.utc)
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(小時|個小時|hours?|hrs?|h|分鐘|分|minutes?|mins?|m)", re.IGNORECASE)
+
+def parse_duration_minutes(value, default: int = 60) -> int :
+    """Parse a duration such as 90, "90", "1.5 小時", "1h30m", "PT45M" or "半小時" into minutes.
+
+    Args:
+        value: Duration given by the intent parser, usually a string or None.
+        default (int, optional): Minutes returned when nothing can be parsed. Defaults to 60.
+
+    Returns:
+        int: Duration in minutes.
+    """
+    if isinstance(value, (int, float)) :
+        return int(value) if value > 0 else default
+    if not value or not isinstance(value, str) :
+        return default
+
+    text = value.strip()
+    if text.isdigit() :
+        return int(text) or default
+    if "半小時" in text :
+        return 30
+
+    minutes = 0.0
+    # ISO 8601 格式 (PT1H30M) 也能被下面的規則解析，只需移除前綴
+    for amount, unit in _DURATION_PATTERN.findall(text.upper().removeprefix("PT")) :
+        if unit.lower().startswith(("小", "個", "h")) :
+            minutes += float(amount) * 60
+        else :
+            minutes += float(amount)
+    return round(minutes) if minutes > 0 else default
+
+def _normalize_name(text: str) -> str :
+    return re.sub(r"[\s\-_'\"「」『』“”]+", "", text or "").casefold()
+
+def same_name(a: str, b: str) -> bool :
+    """Whether two task names are the same once case, spaces and quotes are ignored."""
+    return bool(_normalize_name(a)) and _normalize_name(a) == _normalize_name(b)
+
+def fuzzy_match(query: str, choices: list[str], cutoff: float = 0.6, containment: float = 0.9) -> list[tuple[str, float]] :
+    """Score task names against a spoken name.
+
+    Exact matches (ignoring case, spaces and quotes) score 1.0 and containment `containment`;
+    otherwise the difflib similarity ratio is used.
+
+    Returns:
+        list[tuple[str, float]]: (choice, score) pairs scoring at least `cutoff`, best first.
+    """
+    target = _normalize_name(query)
+    if not target :
+        return []
+
+    scored = []
+    for choice in dict.fromkeys(choices) :
+        candidate = _normalize_name(choice)
+        if not candidate :
+            continue
+        if candidate == target :
+            score = 1.0
+        elif target in candidate or candidate in target :
+            score = containment
+        else :
+            score = difflib.SequenceMatcher(None, target, candidate).ratio()
+        if score >= cutoff :
+            scored.append((choice, score))
+    scored.sort(key = lambda pair : pair[1], reverse = True)
+    return scored
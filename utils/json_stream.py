@@ -0,0 +1,87 @@
+import json
+from utils.logger import logger
+
+class IncrementalJSONParser :
+    """Scan a JSON document as it streams in and hand out members of one object as soon as they close.
+
+    With `path=("recommendations",)` and the scheduler output, every tier object under
+    "recommendations" is returned by `feed()` in the call that delivers its closing brace,
+    while the rest of the document is still being generated. Text outside the root value
+    (e.g. Markdown code fences) is ignored.
+    """
+    def __init__(self, path: tuple[str, ...]) :
+        self.path = tuple(path)
+        self.buffer = []
+        self._pos = 0 # 已掃描的字元數
+        self._stack = [] # [container char, current key, start index]
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None
+        self._done = False
+
+    @property
+    def text(self) -> str :
+        return "".join(self.buffer)
+
+    def feed(self, chunk: str) -> list[tuple[str, object]] :
+        """Consume the next chunk of text.
+
+        Args:
+            chunk (str): Newly received text.
+
+        Returns:
+            list[tuple[str, object]]: (key, value) members of the target object that closed in this chunk.
+        """
+        if not chunk :
+            return []
+        self.buffer.append(chunk)
+        text = self.text if len(self.buffer) > 1 else chunk
+        if len(self.buffer) > 1 :
+            self.buffer = [text]
+
+        completed = []
+        for index in range(self._pos, len(text)) :
+            if self._done :
+                break
+            char = text[index]
+            if self._in_string :
+                if self._escape :
+                    self._escape = False
+                elif char == "\\" :
+                    self._escape = True
+                elif char == '"' :
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:index]
+                continue
+
+            if not self._stack and char not in "{[" :
+                continue # 根節點之前的雜訊，例如 ```json
+            if char == '"' :
+                self._in_string = True
+                self._string_start = index
+            elif char == ":" and self._stack and self._stack[-1][0] == "{" :
+                self._stack[-1][1] = self._last_string
+            elif char == "," and self._stack and self._stack[-1][0] == "{" :
+                self._stack[-1][1] = None
+            elif char in "{[" :
+                self._stack.append([char, None, index])
+            elif char in "}]" :
+                _, _, start = self._stack.pop()
+                if not self._stack :
+                    self._done = True
+                elif self._is_target_member() :
+                    key = self._stack[-1][1]
+                    try :
+                        completed.append((key, json.loads(text[start:index + 1])))
+                    except ValueError as e :
+                        logger.warning(f"Skip malformed streamed member '{key}': {e}")
+        self._pos = len(text)
+        return completed
+
+    def _is_target_member(self) -> bool :
+        """Whether the value that just closed is a direct member of the object at `self.path`."""
+        if len(self._stack) != len(self.path) + 1 or self._stack[-1][0] != "{" :
+            return False
+        keys = [entry[1] for entry in self._stack[:-1]]
+        return tuple(keys) == self.path